@@ -1,8 +1,13 @@
 
+import os
+import subprocess
+import sys
 from datetime import datetime
 from datetime import timezone as datetime_tz
 import pytest
 
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
 from wagtail.models import Site
 
 import wagtail_factories
@@ -24,6 +29,14 @@ class HomePageFactory(wagtail_factories.PageFactory):
         model = "home.HomePage"
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # the cache outlives each test's db transaction, so start every test empty
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def home_page(autouse=True):
     root_page = wagtail_factories.PageFactory(parent=None)
@@ -93,3 +106,43 @@ def sale_with_items(product):
     SaleCategory.objects.create(category=product.category_page, discount=10, sale=sale)
     SaleProduct.objects.create(product=product, discount=20, sale=sale)
     yield sale
+
+
+@pytest.fixture
+def asgi_get(async_client):
+    # GET through Django's async request handling (as under ASGI), from a sync
+    # test
+    async def get(*args, **kwargs):
+        return await async_client.get(*args, **kwargs)
+
+    yield async_to_sync(get)
+
+
+@pytest.fixture
+def profile_imports():
+    # Run Python code in a new interpreter with -X importtime; returns what it
+    # printed, and the cumulative time taken to import each module (including
+    # the modules it imported), in seconds, slowest first. The interpreter isn't
+    # measured by pytest-cov, which would slow it down.
+    env = {
+        key: value for key, value in os.environ.items() if not key.startswith("COV_")
+    }
+
+    def profile(code):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        )
+        import_times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "[us]" not in line:
+                _, cumulative, module = line.split("|")
+                import_times[module.strip()] = int(cumulative) / 1_000_000
+        return result.stdout, dict(
+            sorted(import_times.items(), key=lambda item: item[1], reverse=True)
+        )
+
+    yield profile
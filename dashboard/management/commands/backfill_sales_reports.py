@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.reports import rebuild_sales_reports
+
+
+class Command(BaseCommand):
+    help = "Rebuild the sales reporting rollups from all paid orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of orders read from the database at a time",
+        )
+
+    def handle(self, chunk_size, **options):
+        days = rebuild_sales_reports(chunk_size=chunk_size)
+        self.stdout.write(f"Sales reports rebuilt for {days} days of orders")
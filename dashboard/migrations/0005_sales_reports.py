@@ -0,0 +1,92 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0029_alter_sale_banner_include_end_and_more"),
+        ("dashboard", "0004_socialsettings_website_url"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                ("orders", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Daily revenue",
+            },
+        ),
+        migrations.CreateModel(
+            name="VariantSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product_id", models.PositiveIntegerField(unique=True)),
+                ("name", models.CharField(max_length=255)),
+                ("units", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Variant sales",
+                "indexes": [
+                    models.Index(fields=["-units"], name="variant_sales_units_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SaleDiscount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("orders", models.IntegerField(default=0)),
+                (
+                    "discount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+                (
+                    "sale",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discount_total",
+                        to="shop.sale",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -40,3 +40,48 @@ class SocialSettings(ClusterableModel, BaseGenericSetting):
             "Social settings",
         )
     ]
+
+
+# SALES REPORTING
+# Rollups of paid orders, maintained by dashboard.signals as orders change status
+# (and rebuilt by the backfill_sales_reports command), so that reports read a
+# handful of rows instead of aggregating orders
+
+
+class DailyRevenue(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily revenue"
+
+    def __str__(self):
+        return f"{self.date}: £{self.revenue}"
+
+
+class VariantSales(models.Model):
+    # Order items refer to product variants by id; the name is stored as it was
+    # on the most recent order, so deleted variants are still reported
+    product_id = models.PositiveIntegerField(unique=True)
+    name = models.CharField(max_length=255)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Variant sales"
+        indexes = [models.Index(fields=["-units"], name="variant_sales_units_idx")]
+
+    def __str__(self):
+        return f"{self.name}: {self.units}"
+
+
+class SaleDiscount(models.Model):
+    sale = models.OneToOneField(
+        "shop.Sale", on_delete=models.CASCADE, related_name="discount_total"
+    )
+    orders = models.IntegerField(default=0)
+    discount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.sale}: £{self.discount}"
@@ -0,0 +1,127 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from salesman.core.utils import get_salesman_model
+
+from shop.models import Sale
+from shop.modifiers import SaleModifier
+
+from .models import DailyRevenue, SaleDiscount, VariantSales
+
+
+Order = get_salesman_model("Order")
+
+# Orders are included in the reports once they have been paid for
+REPORTED_STATUSES = ["PROCESSING", "SHIPPED", "COMPLETED"]
+
+
+class SalesTotals:
+    """
+    Totals for the sales rollups, keyed by rollup row (date, variant, sale)
+    """
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: {"orders": 0, "revenue": Decimal(0)})
+        self.variants = defaultdict(lambda: {"units": 0, "revenue": Decimal(0)})
+        self.variant_names = {}
+        self.sales = defaultdict(lambda: {"orders": 0, "discount": Decimal(0)})
+
+    def add_order(self, order, sign=1):
+        daily = self.daily[timezone.localdate(order.date_created)]
+        daily["orders"] += sign
+        daily["revenue"] += sign * order.total
+
+        discounts = defaultdict(Decimal)
+        for item in order.items.all():
+            variant = self.variants[item.product_id]
+            variant["units"] += sign * item.quantity
+            variant["revenue"] += sign * item.total
+            self.variant_names[item.product_id] = item.name
+            for row in item.extra_rows:
+                if row["modifier"] == SaleModifier.identifier:
+                    sale_id = row.get("extra", {}).get("sale_id") or _sale_id_at(
+                        order.date_created
+                    )
+                    discounts[sale_id] -= Decimal(row["amount"])
+        for sale_id, discount in discounts.items():
+            if sale_id is not None:
+                self.sales[sale_id]["orders"] += sign
+                self.sales[sale_id]["discount"] += sign * discount
+
+
+def _sale_id_at(date):
+    # Orders placed before discounts recorded their sale
+    sale = Sale.objects.filter(start_date__lte=date, end_date__gt=date).first()
+    return sale.id if sale else None
+
+
+def _existing_sale_ids(sale_ids):
+    # Sales may have been deleted since the orders were placed
+    return set(Sale.objects.filter(id__in=sale_ids).values_list("id", flat=True))
+
+
+def _increment(model, lookup, values, **fields):
+    model.objects.get_or_create(**lookup, defaults=fields)
+    model.objects.filter(**lookup).update(
+        **{field: F(field) + value for field, value in values.items()}, **fields
+    )
+
+
+@transaction.atomic
+def update_sales_reports(order, sign=1):
+    """
+    Add an order to (or, with sign=-1, remove it from) the sales rollups
+    """
+    totals = SalesTotals()
+    totals.add_order(order, sign)
+    for date, values in totals.daily.items():
+        _increment(DailyRevenue, {"date": date}, values)
+    for product_id, values in totals.variants.items():
+        _increment(
+            VariantSales,
+            {"product_id": product_id},
+            values,
+            name=totals.variant_names[product_id],
+        )
+    existing_sales = _existing_sale_ids(totals.sales)
+    for sale_id, values in totals.sales.items():
+        if sale_id in existing_sales:
+            _increment(SaleDiscount, {"sale_id": sale_id}, values)
+
+
+@transaction.atomic
+def rebuild_sales_reports(chunk_size=500):
+    """
+    Recalculate the sales rollups from all reported orders
+    """
+    totals = SalesTotals()
+    orders = (
+        Order.objects.filter(status__in=REPORTED_STATUSES)
+        .prefetch_related("items")
+        .order_by("date_created")
+    )
+    for order in orders.iterator(chunk_size=chunk_size):
+        totals.add_order(order)
+
+    DailyRevenue.objects.all().delete()
+    VariantSales.objects.all().delete()
+    SaleDiscount.objects.all().delete()
+    DailyRevenue.objects.bulk_create(
+        DailyRevenue(date=date, **values) for date, values in totals.daily.items()
+    )
+    VariantSales.objects.bulk_create(
+        VariantSales(
+            product_id=product_id, name=totals.variant_names[product_id], **values
+        )
+        for product_id, values in totals.variants.items()
+    )
+    existing_sales = _existing_sale_ids(totals.sales)
+    SaleDiscount.objects.bulk_create(
+        SaleDiscount(sale_id=sale_id, **values)
+        for sale_id, values in totals.sales.items()
+        if sale_id in existing_sales
+    )
+    return len(totals.daily)
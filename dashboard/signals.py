@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from salesman.core.utils import get_salesman_model
+from salesman.orders.signals import status_changed
+
+from .reports import REPORTED_STATUSES, update_sales_reports
+
+
+Order = get_salesman_model("Order")
+
+
+def report_status_change(order, old_status, new_status):
+    """
+    Orders are added to the sales reports when they are paid, and removed again
+    if they are refunded. The order's items may be saved after the order, so the
+    reports are updated once the transaction has committed.
+    """
+    # salesman's old_status is the status the order was loaded with, even after
+    # later saves, so keep track of the status last reported for this instance
+    old_status = getattr(order, "_reported_status", old_status)
+    order._reported_status = new_status
+    was_reported = old_status in REPORTED_STATUSES
+    is_reported = new_status in REPORTED_STATUSES
+    if was_reported != is_reported:
+        sign = 1 if is_reported else -1
+        transaction.on_commit(lambda: update_sales_reports(order, sign))
+
+
+@receiver(post_save, sender=Order)
+def update_sales_reports_on_order_creation(sender, instance, created, **kwargs):
+    # status_changed isn't sent for orders created with their initial status
+    if created:
+        report_status_change(instance, None, instance.status)
+
+
+@receiver(status_changed)
+def update_sales_reports_on_status_change(
+    sender, order, new_status, old_status, **kwargs
+):
+    report_status_change(order, old_status, new_status)
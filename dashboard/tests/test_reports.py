@@ -0,0 +1,165 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from salesman.core.utils import get_salesman_model
+
+from ..models import DailyRevenue, SaleDiscount, VariantSales
+from ..wagtail_hooks import SalesReportPanel
+
+
+pytestmark = pytest.mark.django_db
+
+Order = get_salesman_model("Order")
+
+
+def set_status(order, status, capture_on_commit_callbacks):
+    with capture_on_commit_callbacks(execute=True):
+        order.status = status
+        order.save()
+
+
+def test_paid_order_added_to_reports(order, django_capture_on_commit_callbacks):
+    assert not DailyRevenue.objects.exists()
+
+    set_status(order, Order.Status.PROCESSING, django_capture_on_commit_callbacks)
+    daily = DailyRevenue.objects.get()
+    assert daily.date == timezone.localdate(order.date_created)
+    assert daily.orders == 1
+    assert daily.revenue == order.total
+    variant = VariantSales.objects.get()
+    assert variant.name == "Test Product - Small"
+    assert variant.units == 2
+    assert variant.revenue == Decimal(20)
+
+    # still reported once completed
+    set_status(order, Order.Status.COMPLETED, django_capture_on_commit_callbacks)
+    assert DailyRevenue.objects.get().orders == 1
+
+
+def test_refunded_order_removed_from_reports(order, django_capture_on_commit_callbacks):
+    set_status(order, Order.Status.PROCESSING, django_capture_on_commit_callbacks)
+    set_status(order, Order.Status.REFUNDED, django_capture_on_commit_callbacks)
+    daily = DailyRevenue.objects.get()
+    assert (daily.orders, daily.revenue) == (0, 0)
+    assert VariantSales.objects.get().units == 0
+
+
+def test_order_created_as_paid(basket, django_capture_on_commit_callbacks):
+    # items are saved after the order, so are only counted once committed
+    with django_capture_on_commit_callbacks(execute=True):
+        Order.objects.create_from_basket(
+            basket, request=None, status=Order.Status.PROCESSING
+        )
+    assert VariantSales.objects.get().units == 2
+
+
+def test_sale_discount_reported(
+    freezer, sale_with_items, basket, django_capture_on_commit_callbacks
+):
+    freezer.move_to("2022-01-01 09:00")
+    basket.update(request=None)
+    with django_capture_on_commit_callbacks(execute=True):
+        order = Order.objects.create_from_basket(
+            basket, request=None, status=Order.Status.PROCESSING
+        )
+    [item] = order.items.all()
+    assert item.extra_rows[0]["extra"] == {"sale_id": sale_with_items.id}
+    sale_discount = SaleDiscount.objects.get()
+    assert sale_discount.sale == sale_with_items
+    assert sale_discount.orders == 1
+    assert sale_discount.discount == -Decimal(item.extra_rows[0]["amount"])
+
+
+def test_backfill_sales_reports(
+    capsys, freezer, sale_with_items, product, django_capture_on_commit_callbacks
+):
+    freezer.move_to("2022-01-01 09:00")
+    variant = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Large", stock=10
+    )
+    orders = []
+    for time, status in [
+        ("2022-01-01 09:00", "PROCESSING"),
+        ("2022-01-01 10:00", "COMPLETED"),
+        ("2022-01-02 09:00", "HOLD"),
+    ]:
+        freezer.move_to(time)
+        basket = baker.make("shop.Basket")
+        basket.add(variant, quantity=1)
+        with django_capture_on_commit_callbacks(execute=True):
+            orders.append(
+                Order.objects.create_from_basket(basket, request=None, status=status)
+            )
+    # an order placed before discounts recorded their sale
+    item = orders[1].items.get()
+    item.extra_rows[0]["extra"] = {}
+    item.save()
+
+    incremental = {
+        "daily": list(DailyRevenue.objects.values("date", "orders", "revenue")),
+        "variants": list(VariantSales.objects.values("product_id", "name", "units")),
+        "sales": list(SaleDiscount.objects.values("sale", "orders", "discount")),
+    }
+    assert incremental["daily"] == [
+        {"date": date(2022, 1, 1), "orders": 2, "revenue": Decimal("22.80")}
+    ]
+
+    call_command("backfill_sales_reports")
+    assert "Sales reports rebuilt for 1 days of orders" in capsys.readouterr().out
+    assert incremental == {
+        "daily": list(DailyRevenue.objects.values("date", "orders", "revenue")),
+        "variants": list(VariantSales.objects.values("product_id", "name", "units")),
+        "sales": list(SaleDiscount.objects.values("sale", "orders", "discount")),
+    }
+
+
+def test_deleted_sale_not_reported(
+    freezer, sale_with_items, basket, django_capture_on_commit_callbacks
+):
+    freezer.move_to("2022-01-01 09:00")
+    basket.update(request=None)
+    with django_capture_on_commit_callbacks(execute=True):
+        order = Order.objects.create_from_basket(basket, request=None)
+    sale_with_items.delete()
+    set_status(order, Order.Status.PROCESSING, django_capture_on_commit_callbacks)
+    assert DailyRevenue.objects.exists()
+    assert not SaleDiscount.objects.exists()
+    call_command("backfill_sales_reports")
+    assert not SaleDiscount.objects.exists()
+
+
+def test_report_str(sale_with_items):
+    assert str(DailyRevenue(date=date(2022, 1, 1), revenue=10)) == "2022-01-01: £10"
+    assert str(VariantSales(name="Mug", units=3)) == "Mug: 3"
+    assert (
+        str(SaleDiscount(sale=sale_with_items, discount=2))
+        == "Test Sale (01Jan22 - 02Jan22): £2"
+    )
+
+
+def test_sales_report_panel(
+    rf, admin_user, freezer, sale_with_items, django_assert_num_queries
+):
+    freezer.move_to("2022-01-10 09:00")
+    for day in range(1, 11):
+        baker.make(DailyRevenue, date=date(2022, 1, day), orders=1, revenue=10)
+    baker.make(VariantSales, name="Test Product - Small", units=4, _quantity=12)
+    baker.make(SaleDiscount, sale=sale_with_items, orders=1, discount=2)
+    request = rf.get("/admin/")
+    request.user = admin_user
+
+    with django_assert_num_queries(4):
+        html = SalesReportPanel().render_html({"request": request})
+    assert "10 paid orders" in html
+    assert "£100.00 revenue" in html
+    assert html.count("Test Product - Small") == 10
+    assert "Test Sale" in html
+
+
+def test_sales_report_panel_on_dashboard(client, admin_user, django_user_model):
+    client.force_login(admin_user)
+    assert 'id="sales-report' in client.get("/admin/").content.decode()
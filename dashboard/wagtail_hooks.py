@@ -1,12 +1,19 @@
+from datetime import timedelta
+
+from django.db.models import Sum
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from wagtail import hooks
 from wagtail.admin.menu import MenuItem
+from wagtail.admin.ui.components import Component
 from wagtail.snippets.models import register_snippet
 from wagtail.snippets.views.snippets import SnippetViewSet
 
 from home.models import FooterText
 
+from .models import DailyRevenue, SaleDiscount, VariantSales
+
 
 class FooterTextViewSet(SnippetViewSet):
     model = FooterText
@@ -26,4 +33,37 @@ def register_collections_menu_item():
     )
 
 
+class SalesReportPanel(Component):
+    """
+    Sales summary for the admin dashboard. Reads a bounded number of rows from
+    the sales rollups, however many orders there are.
+    """
+
+    name = "sales_report"
+    template_name = "dashboard/sales_report_panel.html"
+    order = 50
+    days = 30
+
+    def get_context_data(self, parent_context):
+        context = super().get_context_data(parent_context)
+        since = timezone.localdate() - timedelta(days=self.days - 1)
+        daily = DailyRevenue.objects.filter(date__gte=since).order_by("-date")
+        context.update(
+            days=self.days,
+            daily=daily,
+            totals=daily.aggregate(orders=Sum("orders"), revenue=Sum("revenue")),
+            top_variants=VariantSales.objects.order_by("-units")[:10],
+            sales=SaleDiscount.objects.select_related("sale").order_by(
+                "-sale__start_date"
+            )[:5],
+        )
+        return context
+
+
+@hooks.register("construct_homepage_panels")
+def add_sales_report_panel(request, panels):
+    if request.user.has_perm("shop.view_order"):
+        panels.append(SalesReportPanel())
+
+
 register_snippet(FooterTextViewSet)
@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration, read from the working directory when gunicorn starts
+(see the Dockerfile). Any setting can be overridden on the command line or in
+GUNICORN_CMD_ARGS.
+
+The application is loaded and warmed up (see home.warmup) once, in the master
+process, before the workers are forked from it: the workers start ready to
+serve, and share the master's memory (imported modules, compiled templates and
+URL patterns) for as long as they only read it.
+"""
+
+import gc
+import os
+
+
+wsgi_app = "pips_shop.asgi:application"
+# Async workers (see pips_shop/asgi.py), one per CPU by default. Under ASGI
+# database connections aren't reused between requests, and are closed after
+# each one unless DATABASE_CONN_MAX_AGE is set: without an external pooler
+# (see DATABASE_POOLER) every request pays for connecting to the database.
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count()))
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+preload_app = True
+# Replace each worker after this many requests, to bound the memory it
+# gains over time; the jitter keeps the workers from restarting together
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # Called in the master once the application is loaded, before the workers
+    # are forked
+    from django.db import connections
+
+    from home.warmup import warm_up
+
+    templates = warm_up()
+    # the workers can't share the master's database connections
+    connections.close_all()
+    server.log.info("Warmed up: %d templates compiled", templates)
+    # Keep the garbage collector away from the objects the workers inherit, so
+    # that collections in the workers don't write to (and so copy) the pages
+    # they share with the master
+    gc.freeze()
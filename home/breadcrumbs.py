@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from wagtail.models import Page
+
+
+# Trails are keyed by the page's url_path, and are lists of {"title", "url"} dicts
+# for the page and its ancestors (excluding the tree root), so that rendering them
+# needs no queries
+BREADCRUMBS_CACHE_KEY = "breadcrumbs:{}"
+
+
+def _ancestor_paths(path):
+    # treebeard paths of a page and its ancestors, excluding the root
+    return [path[:i] for i in range(Page.steplen * 2, len(path) + 1, Page.steplen)]
+
+
+def _crumb(page):
+    return {"title": page.title, "url": page.get_url()}
+
+
+def build_trails(pages):
+    """
+    Return the breadcrumb trails for the given pages, keyed by treebeard path.
+    All the ancestors needed are fetched in a single query; paths that aren't in
+    the database, such as that of a new page being previewed, are skipped.
+    """
+    paths = {path for page in pages for path in _ancestor_paths(page.path)}
+    crumbs = {page.path: _crumb(page) for page in Page.objects.filter(path__in=paths)}
+    return {
+        page.path: [
+            crumbs[path] for path in _ancestor_paths(page.path) if path in crumbs
+        ]
+        for page in pages
+    }
+
+
+def get_breadcrumbs(page):
+    if page.pk is None:
+        # A new page being previewed, with a made up path; its trail is not cached,
+        # as a page saved later with the same url_path may be somewhere else
+        return build_trails([page])[page.path] + [_crumb(page)]
+    key = BREADCRUMBS_CACHE_KEY.format(page.url_path)
+    trail = cache.get(key)
+    if trail is None:
+        trail = build_trails([page])[page.path]
+        cache.set(key, trail, None)
+    return trail
+
+
+def cache_breadcrumbs(page):
+    """
+    Precompute the trails for a page and all its descendants; a change to the
+    page's title or location changes all of their trails
+    """
+    pages = list(Page.objects.descendant_of(page, inclusive=True))
+    trails = build_trails(pages)
+    cache.set_many(
+        {
+            BREADCRUMBS_CACHE_KEY.format(descendant.url_path): trails[descendant.path]
+            for descendant in pages
+        },
+        None,
+    )
+
+
+def clear_breadcrumbs(page, url_path=None):
+    """
+    Clear the trails for a page and all its descendants. If the page has moved,
+    url_path is its url_path before the move.
+    """
+    old_url_path = url_path or page.url_path
+    url_paths = Page.objects.descendant_of(page, inclusive=True).values_list(
+        "url_path", flat=True
+    )
+    cache.delete_many(
+        [
+            BREADCRUMBS_CACHE_KEY.format(
+                old_url_path + descendant[len(page.url_path) :]
+            )
+            for descendant in url_paths
+        ]
+    )
@@ -0,0 +1,78 @@
+from asgiref.local import Local
+from wagtail.models import Page
+
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+# Models that shoppers only read: catalogue pages and sales, the search index
+# and the reporting rollups. Everything else, including baskets, orders,
+# product variants (which hold the stock) and products (which hold the stock
+# counters, see shop.stock), is always read from the primary.
+REPLICA_MODELS = {
+    "shop.sale",
+    "shop.salecategory",
+    "shop.saleproduct",
+    "dashboard.dailyrevenue",
+    "dashboard.variantsales",
+    "dashboard.salediscount",
+}
+REPLICA_APPS = {"wagtailsearch"}
+
+# Per request (or thread, outside of requests) routing state
+_state = Local()
+
+
+def reset_routing(pinned=False):
+    """Start a request, reading from the replica unless pinned to the primary"""
+    _state.pinned = pinned
+    _state.written = False
+
+
+def pin_primary():
+    """Read from the primary for the rest of the request"""
+    _state.pinned = True
+
+
+def has_written():
+    """Whether replica models have been written to since reset_routing()"""
+    return getattr(_state, "written", False)
+
+
+def is_replica_model(model):
+    return (
+        issubclass(model, Page)
+        or model._meta.label_lower in REPLICA_MODELS
+        or model._meta.app_label in REPLICA_APPS
+    )
+
+
+class ReplicaRouter:
+    """
+    Send reads of replica models to the replica database, and everything else
+    to the primary. Once a replica model has been written to, reads stay on the
+    primary for the rest of the request (see
+    home.middleware.replica_pinning_middleware for the following requests).
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_replica_model(model) or getattr(_state, "pinned", False):
+            return PRIMARY
+        # keep related objects on the database their instance came from
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db == PRIMARY:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        if is_replica_model(model):
+            _state.pinned = _state.written = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica has the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # the replica is migrated by replication
+        return db != REPLICA
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import stripe
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Time concurrent requests to the Stripe success page, with a fake Stripe "
+        "API that takes --latency seconds to respond: first through the WSGI "
+        "handler with --workers sync workers, then through the ASGI handler on "
+        "one event loop, as in one uvicorn worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="Number of concurrent requests",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of sync workers (gunicorn's default worker class)",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.2,
+            help="Seconds the fake Stripe API takes to respond",
+        )
+        parser.add_argument(
+            "--host",
+            help="Host header (default: the first of ALLOWED_HOSTS)",
+        )
+
+    def handle(self, requests, workers, latency, host, **options):
+        host = host or settings.ALLOWED_HOSTS[0].lstrip(".").replace("*", "localhost")
+        path = reverse("stripe-success")
+        server = fake_stripe_server(latency)
+        api_base = stripe.api_base
+        stripe.api_base = f"http://{server.server_address[0]}:{server.server_port}"
+        try:
+            for label, run in [
+                (f"WSGI, {workers} sync workers", run_wsgi),
+                ("ASGI, 1 async worker", run_asgi),
+            ]:
+                start = time.perf_counter()
+                statuses = run(path, host, requests, workers)
+                seconds = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label}: {requests} requests "
+                    f"({', '.join(sorted(statuses))}) in {seconds:.2f}s, "
+                    f"{requests / seconds:.1f} requests/s"
+                )
+        finally:
+            stripe.api_base = api_base
+            server.shutdown()
+            server.server_close()
+
+
+def fake_stripe_server(latency):
+    """
+    Serve the Stripe checkout session and customer lookups made by the success
+    page, each after the given latency, from a thread
+    """
+
+    class FakeStripe(BaseHTTPRequestHandler):
+        # keep connections open between requests, as Stripe's API does
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.startswith("/v1/customers/"):
+                data = {"object": "customer", "email": "benchmark@example.com"}
+            else:
+                data = {
+                    "object": "checkout.session",
+                    "customer": "cus_benchmark",
+                    "amount_total": 1000,
+                }
+            body = json.dumps({"id": self.path.rsplit("/", 1)[-1], **data})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStripe)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_wsgi(path, host, requests, workers):
+    handler = WSGIHandler()
+    environ = (
+        RequestFactory()
+        .get(path, {"session_id": "cs_benchmark"}, HTTP_HOST=host)
+        .environ
+    )
+    statuses = set()
+
+    def request(_):
+        response = handler(dict(environ), lambda status, headers: statuses.add(status))
+        b"".join(response)
+        response.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(request, range(requests)))
+    return statuses
+
+
+def run_asgi(path, host, requests, workers):
+    handler = ASGIHandler()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"session_id=cs_benchmark",
+        "root_path": "",
+        "headers": [(b"host", host.encode())],
+        "client": ("127.0.0.1", 0),
+        "server": (host, 80),
+    }
+    statuses = set()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status = HTTPStatus(message["status"])
+            statuses.add(f"{status.value} {status.phrase}")
+
+    async def run():
+        await asyncio.gather(
+            *(handler(dict(scope), receive, send) for _ in range(requests))
+        )
+
+    # Coverage stops tracing the calling frame once httpx has run on an event
+    # loop in the same thread, so the loop gets a thread of its own
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(asyncio.run, run()).result()
+    return statuses
@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    help = (
+        "Time requests to a page through the WSGI handler, first connecting to "
+        "the database for each request, then reusing a persistent connection "
+        "(DATABASE_CONN_MAX_AGE)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="URL path to request")
+        parser.add_argument(
+            "--host",
+            help="Host header (default: the first of ALLOWED_HOSTS)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests to time for each connection setting",
+        )
+
+    def handle(self, path, host, requests, **options):
+        host = host or settings.ALLOWED_HOSTS[0].lstrip(".").replace("*", "localhost")
+        # The test client doesn't close connections at the end of requests, so
+        # requests go through the WSGI handler, as they do under gunicorn
+        environ = RequestFactory().get(path, HTTP_HOST=host).environ
+        handler = WSGIHandler()
+        conn_max_age = connection.settings_dict["CONN_MAX_AGE"]
+        try:
+            for label, max_age in [
+                ("New connection per request", 0),
+                ("Persistent connection", conn_max_age or 600),
+            ]:
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                timings, connections, statuses = time_requests(
+                    handler, environ, requests
+                )
+                self.stdout.write(
+                    f"{label} (CONN_MAX_AGE={max_age}): {requests} requests "
+                    f"({', '.join(sorted(statuses))}), "
+                    f"{connections} connections, "
+                    f"median {statistics.median(timings):.2f}ms, "
+                    f"mean {statistics.mean(timings):.2f}ms"
+                )
+        finally:
+            connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+
+
+def time_requests(handler, environ, requests):
+    """
+    Time each request in milliseconds, and count the database connections made
+    """
+    connections = []
+    statuses = set()
+
+    def count_connection(sender, connection, **kwargs):
+        connections.append(connection)
+
+    connection_created.connect(count_connection)
+    timings = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = handler(
+                dict(environ), lambda status, headers: statuses.add(status)
+            )
+            b"".join(response)
+            # sends request_finished, which closes connections past their age
+            response.close()
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        connection_created.disconnect(count_connection)
+    return timings, len(connections), statuses
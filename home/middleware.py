@@ -0,0 +1,114 @@
+from inspect import isawaitable
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.decorators import sync_and_async_middleware
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .db_router import has_written, reset_routing
+from .page_cache import is_cacheable, page_cache_key
+
+
+# Set for a short time after a request writes data that is read from the
+# replica, so the following requests read from the primary while the replica
+# catches up
+PIN_PRIMARY_COOKIE = "pin_primary"
+
+
+@sync_and_async_middleware
+def static_files_middleware(get_response):
+    # WhiteNoise's middleware is sync only, which would make Django run async
+    # views in a thread under ASGI. Static files are looked up in memory, and
+    # any other request is passed straight on to get_response, so wrap it to
+    # await the response when the rest of the stack is async.
+    whitenoise = WhiteNoiseMiddleware(get_response)
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            response = whitenoise(request)
+            if isawaitable(response):
+                response = await response
+            return response
+
+        return middleware
+    return whitenoise
+
+
+def _cached_page_response(request):
+    # the cached page for the request, or None
+    if is_cacheable(request):
+        content = cache.get(page_cache_key(request))
+        if content is not None:
+            # set the visitor's CSRF cookie, which the cached page can't hold
+            get_token(request)
+            response = HttpResponse(content)
+            response.headers["X-Page-Cache"] = "HIT"
+            return response
+    return None
+
+
+@sync_and_async_middleware
+def page_cache_middleware(get_response):
+    # Serve pages stored by CachedPageMixin without routing or rendering them
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            # checking the visitor may load the session and user
+            response = await sync_to_async(_cached_page_response)(request)
+            if response is None:
+                response = await get_response(request)
+            return response
+
+    else:
+
+        def middleware(request):
+            response = _cached_page_response(request)
+            if response is None:
+                response = get_response(request)
+            return response
+
+    return middleware
+
+
+def _start_routing(request):
+    reset_routing(
+        pinned=request.method not in ("GET", "HEAD", "OPTIONS")
+        or PIN_PRIMARY_COOKIE in request.COOKIES
+    )
+
+
+def _pin_following_requests(response):
+    if has_written():
+        response.set_cookie(
+            PIN_PRIMARY_COOKIE,
+            "1",
+            max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_pinning_middleware(get_response):
+    # Read your own writes: requests that may write (and usually read what they
+    # change first), and requests just after a write, read from the primary
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            _start_routing(request)
+            return _pin_following_requests(await get_response(request))
+
+    else:
+
+        def middleware(request):
+            _start_routing(request)
+            return _pin_following_requests(get_response(request))
+
+    return middleware
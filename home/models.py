@@ -25,8 +25,10 @@ from wagtail.models import (
     TranslatableMixin,
 )
 
+from .page_cache import CachedPageMixin
 
-class HomePage(Page):
+
+class HomePage(CachedPageMixin, Page):
     """
     The Home Page. This looks slightly more complicated than it is. You can
     see if you visit your site and edit the homepage that it is split between
@@ -366,7 +368,7 @@ class FormPage(AbstractEmailForm):
         return "\n\n".join(content)
 
 
-class StandardPage(Page):
+class StandardPage(CachedPageMixin, Page):
     """
     A generic content page.
     """
@@ -392,6 +394,9 @@ class StandardPage(Page):
     subpage_types = ["StandardPage"]
 
 
+FOOTER_TEXT_CACHE_KEY = "footer_text_html"
+
+
 class FooterText(
     DraftStateMixin,
     RevisionMixin,
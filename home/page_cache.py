@@ -0,0 +1,107 @@
+import hashlib
+import math
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils import timezone
+
+from .db_router import pin_primary
+
+
+# Every cached page key includes the current version; changing the version
+# invalidates all cached pages at once
+PAGE_CACHE_VERSION_KEY = "page_cache:version"
+PAGE_CACHE_KEY = "page_cache:{version}:{path}"
+
+
+def page_cache_version():
+    return cache.get_or_set(PAGE_CACHE_VERSION_KEY, uuid4().hex, None)
+
+
+def page_cache_key(request):
+    path = hashlib.md5(
+        f"{request.get_host()}{request.get_full_path()}".encode()
+    ).hexdigest()
+    return PAGE_CACHE_KEY.format(version=page_cache_version(), path=path)
+
+
+def clear_page_cache():
+    cache.set(PAGE_CACHE_VERSION_KEY, uuid4().hex, None)
+
+
+def is_cacheable(request):
+    """
+    Only anonymous GET requests are cached. Requests with pending messages are
+    excluded, as the messages would be rendered into the page.
+    """
+    user = getattr(request, "user", None)
+    return (
+        request.method == "GET"
+        and not getattr(request, "is_preview", False)
+        and user is not None
+        and not user.is_authenticated
+        and CookieStorage.cookie_name not in request.COOKIES
+        and SessionStorage.session_key not in getattr(request, "session", {})
+    )
+
+
+def page_etag(*parts):
+    """
+    ETag for a page that is rendered the same for every visitor, from the parts
+    that identify the state of the page's own content. Only for cacheable
+    requests (see is_cacheable); others always get the full page.
+    """
+    version = ":".join(str(part) for part in parts)
+    return hashlib.md5(version.encode()).hexdigest()
+
+
+def page_cache_timeout():
+    # Don't let a cached page outlive the start or end of a sale
+    from shop.models import Sale
+
+    timeout = settings.PAGE_CACHE_SECONDS
+    next_change = Sale.next_change()
+    if next_change is not None:
+        seconds_to_change = (next_change - timezone.now()).total_seconds()
+        timeout = min(timeout, math.ceil(seconds_to_change))
+    return timeout
+
+
+class CachedPageMixin:
+    """
+    Page mixin that stores the rendered page for anonymous GET requests, to be
+    served by home.middleware.page_cache_middleware.
+
+    The rendered page must be the same for every visitor; templates can check
+    `cached_page` and load any per-visitor content with htmx instead.
+    """
+
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        context["cached_page"] = True
+        return context
+
+    def serve(self, request, *args, **kwargs):
+        if is_cacheable(request):
+            # A page rendered from a lagging replica would be served to
+            # everyone until the cache expires; pages are only rendered once
+            # per cache version, so render them from the primary
+            pin_primary()
+        response = super().serve(request, *args, **kwargs)
+        if (
+            response.status_code == 200
+            and is_cacheable(request)
+            # a visitor who has passed a restriction would share the page
+            and not self.get_view_restrictions().exists()
+        ):
+            # The page can't hold the visitor's CSRF token; htmx requests send
+            # it from the cookie instead (see main.js)
+            get_token(request)
+            response.render()
+            cache.set(page_cache_key(request), response.content, page_cache_timeout())
+            response.headers["X-Page-Cache"] = "MISS"
+        return response
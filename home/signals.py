@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.models import PageViewRestriction
+from wagtail.signals import (
+    page_published,
+    page_unpublished,
+    post_page_move,
+    published,
+    unpublished,
+)
+
+from dashboard.models import SiteSettings, SocialSettings
+from shop.models import ShopSettings
+
+from .breadcrumbs import cache_breadcrumbs, clear_breadcrumbs
+from .models import FOOTER_TEXT_CACHE_KEY, FooterText
+from .page_cache import clear_page_cache
+
+
+@receiver(published, sender=FooterText)
+@receiver(unpublished, sender=FooterText)
+@receiver(post_save, sender=FooterText)
+@receiver(post_delete, sender=FooterText)
+def clear_footer_text_cache(sender, **kwargs):
+    cache.delete(FOOTER_TEXT_CACHE_KEY)
+    clear_page_cache()
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_page_move)
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_save, sender=SocialSettings)
+@receiver(post_save, sender=ShopSettings)
+def clear_cached_pages(sender, **kwargs):
+    clear_page_cache()
+
+
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def clear_cached_restricted_pages(sender, **kwargs):
+    # Pages cached before a view restriction was added mustn't be served to
+    # visitors who haven't passed it
+    clear_page_cache()
+
+
+@receiver(page_published)
+def cache_page_breadcrumbs(sender, instance, **kwargs):
+    cache_breadcrumbs(instance)
+
+
+@receiver(post_page_move)
+def cache_moved_page_breadcrumbs(sender, instance, url_path_before, **kwargs):
+    clear_breadcrumbs(instance, url_path=url_path_before)
+    cache_breadcrumbs(instance)
+
+
+@receiver(page_unpublished)
+def clear_page_breadcrumbs(sender, instance, **kwargs):
+    clear_breadcrumbs(instance)
@@ -1,7 +1,11 @@
 from django import template
-from wagtail.models import Page, Site
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from wagtail.models import Site
 
-from home.models import FooterText
+from home.breadcrumbs import get_breadcrumbs
+from home.models import FOOTER_TEXT_CACHE_KEY, FooterText
 
 
 register = template.Library()
@@ -78,25 +82,40 @@ def breadcrumbs(context):
         # When on the home page, displaying breadcrumbs is irrelevant.
         ancestors = ()
     else:
-        ancestors = Page.objects.ancestor_of(self, inclusive=True).filter(depth__gt=1)
+        ancestors = get_breadcrumbs(self)
     return {
         "ancestors": ancestors,
         "request": context["request"],
     }
 
 
-@register.inclusion_tag("dashboard/includes/footer_text.html", takes_context=True)
+def _render_footer_text(footer_text):
+    return render_to_string(
+        "dashboard/includes/footer_text.html", {"footer_text": footer_text}
+    )
+
+
+@register.simple_tag(takes_context=True)
 def get_footer_text(context):
     # Get the footer text from the context if exists,
     # so that it's possible to pass a custom instance e.g. for previews
     # or page types that need a custom footer
     footer_text = context.get("footer_text", "")
-
-    # If the context doesn't have footer_text defined, get one that's live
-    if not footer_text:
-        instances = FooterText.objects.filter(live=True)
-        footer_text = instances.latest("id").body if instances.exists() else ""
-
-    return {
-        "footer_text": footer_text,
-    }
+    if footer_text:
+        return _render_footer_text(footer_text)
+
+    # If the context doesn't have footer_text defined, use the rendered live one
+    return mark_safe(get_live_footer_html())
+
+
+def get_live_footer_html():
+    """
+    The rendered live footer text, from the cache; it is cleared whenever a
+    FooterText is published/unpublished
+    """
+    footer_html = cache.get(FOOTER_TEXT_CACHE_KEY)
+    if footer_html is None:
+        instance = FooterText.objects.filter(live=True).order_by("-id").first()
+        footer_html = _render_footer_text(instance.body if instance else "")
+        cache.set(FOOTER_TEXT_CACHE_KEY, footer_html, None)
+    return footer_html
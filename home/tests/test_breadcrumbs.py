@@ -0,0 +1,91 @@
+import pytest
+import wagtail_factories
+from django.core.cache import cache
+from django.template import Context, Template
+
+from ..breadcrumbs import BREADCRUMBS_CACHE_KEY, get_breadcrumbs
+from ..models import StandardPage
+
+
+pytestmark = pytest.mark.django_db
+
+
+class StandardPageFactory(wagtail_factories.PageFactory):
+    class Meta:
+        model = StandardPage
+
+
+@pytest.fixture
+def page_with_child(home_page):
+    parent = StandardPageFactory(parent=home_page, title="Parent")
+    child = StandardPageFactory(parent=parent, title="Child")
+    yield parent, child
+
+
+def render_breadcrumbs(rf, page):
+    template = Template("{% load navigation_tags %}{% breadcrumbs %}")
+    return template.render(Context({"request": rf.get(page.url), "self": page}))
+
+
+def test_breadcrumbs_are_cached(rf, page_with_child, django_assert_num_queries):
+    parent, child = page_with_child
+    assert [crumb["title"] for crumb in get_breadcrumbs(child)] == [
+        "Home",
+        "Parent",
+        "Child",
+    ]
+    with django_assert_num_queries(0):
+        content = render_breadcrumbs(rf, child)
+    assert f'<a href="{parent.get_url()}">Parent</a>' in content
+    assert '<li aria-current="page">Child</li>' in content
+
+
+def test_breadcrumbs_precomputed_on_publish(admin_user, page_with_child):
+    parent, child = page_with_child
+    get_breadcrumbs(child)
+
+    parent.title = "New Parent"
+    parent.save_revision(user=admin_user).publish()
+    # the whole subtree is recomputed
+    assert cache.get(BREADCRUMBS_CACHE_KEY.format(parent.url_path))[-1] == {
+        "title": "New Parent",
+        "url": parent.get_url(),
+    }
+    assert [crumb["title"] for crumb in get_breadcrumbs(child)] == [
+        "Home",
+        "New Parent",
+        "Child",
+    ]
+
+
+def test_breadcrumbs_precomputed_on_move(home_page, page_with_child):
+    parent, child = page_with_child
+    old_url_path = child.url_path
+    get_breadcrumbs(child)
+
+    child.move(home_page, pos="last-child")
+    child.refresh_from_db()
+    assert cache.get(BREADCRUMBS_CACHE_KEY.format(old_url_path)) is None
+    assert [crumb["title"] for crumb in get_breadcrumbs(child)] == ["Home", "Child"]
+
+
+def test_breadcrumbs_cleared_on_unpublish(page_with_child):
+    parent, child = page_with_child
+    get_breadcrumbs(child)
+
+    parent.unpublish()
+    assert cache.get(BREADCRUMBS_CACHE_KEY.format(parent.url_path)) is None
+    assert cache.get(BREADCRUMBS_CACHE_KEY.format(child.url_path)) is None
+
+
+def test_breadcrumbs_of_new_page_preview(rf, page_with_child):
+    parent, child = page_with_child
+    # the unsaved page the page editor previews, at the next child path
+    page = StandardPage(title="New", slug="new", depth=child.depth)
+    page.path = child._inc_path()
+    page.set_url_path(parent)
+
+    content = render_breadcrumbs(rf, page)
+    assert f'<a href="{parent.get_url()}">Parent</a>' in content
+    assert '<li aria-current="page">New</li>' in content
+    assert cache.get(BREADCRUMBS_CACHE_KEY.format(page.url_path)) is None
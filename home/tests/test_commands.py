@@ -0,0 +1,57 @@
+import re
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def own_connection(monkeypatch):
+    # The command closes the connection between requests, which would end the
+    # test transaction, so it is given a connection of its own
+    own_connection = connections.create_connection("default")
+    monkeypatch.setattr(connections._connections, "default", own_connection)
+    yield own_connection
+    own_connection.close()
+
+
+def test_benchmark_db_connections(capsys, monkeypatch, own_connection):
+    conn_max_age = connection.settings_dict["CONN_MAX_AGE"]
+    # a page that reads the database without writing to it, as the command's
+    # queries are committed (see test_benchmark_concurrency)
+    monkeypatch.setattr(
+        "shop.context_processors.get_basket_quantity", lambda request: 0
+    )
+    path = f"{reverse('search')}?q=product"
+    call_command("benchmark_db_connections", path=path, requests=3)
+    new, persistent = capsys.readouterr().out.splitlines()
+    assert re.match(
+        r"New connection per request \(CONN_MAX_AGE=0\): 3 requests \(200 OK\), "
+        r"3 connections, median [\d.]+ms, mean [\d.]+ms",
+        new,
+    )
+    assert re.match(
+        rf"Persistent connection \(CONN_MAX_AGE={conn_max_age or 600}\): "
+        r"3 requests \(200 OK\), 1 connections",
+        persistent,
+    )
+    assert connection.settings_dict["CONN_MAX_AGE"] == conn_max_age
+
+
+def test_benchmark_concurrency(capsys, monkeypatch):
+    # The requests are made from other threads, on connections of their own, so
+    # their queries are committed; visitors without a basket don't write.
+    monkeypatch.setattr(
+        "shop.context_processors.get_basket_quantity", lambda request: 0
+    )
+    call_command("benchmark_concurrency", requests=2, workers=2, latency=0)
+    wsgi, asgi = capsys.readouterr().out.splitlines()
+    assert re.match(
+        r"WSGI, 2 sync workers: 2 requests \(200 OK\) in [\d.]+s, [\d.]+ requests/s",
+        wsgi,
+    )
+    assert re.match(r"ASGI, 1 async worker: 2 requests \(200 OK\) in ", asgi)
@@ -0,0 +1,123 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory
+from salesman.core.utils import get_salesman_model
+from wagtail.search.models import IndexEntry
+
+from dashboard.models import DailyRevenue
+from shop.models import CategoryPage, Product, ProductVariant, Sale
+
+from ..db_router import (
+    PRIMARY,
+    REPLICA,
+    ReplicaRouter,
+    has_written,
+    reset_routing,
+)
+from ..middleware import PIN_PRIMARY_COOKIE, replica_pinning_middleware
+
+
+Basket = get_salesman_model("Basket")
+Order = get_salesman_model("Order")
+
+pytestmark = pytest.mark.django_db
+
+router = ReplicaRouter()
+
+
+@pytest.fixture(autouse=True)
+def routing():
+    reset_routing()
+    yield
+    reset_routing()
+
+
+@pytest.mark.parametrize(
+    "model, db",
+    [
+        (CategoryPage, REPLICA),
+        (Sale, REPLICA),
+        (IndexEntry, REPLICA),
+        (DailyRevenue, REPLICA),
+        # stock, stock counters, baskets and orders
+        (ProductVariant, PRIMARY),
+        (Product, PRIMARY),
+        (Basket, PRIMARY),
+        (Order, PRIMARY),
+    ],
+)
+def test_db_for_read(model, db):
+    assert router.db_for_read(model) == db
+
+
+def test_related_objects_read_from_their_instance_db(basket):
+    product = basket.items.first().product.product
+    assert product._state.db == PRIMARY
+    assert router.db_for_read(CategoryPage, instance=product) == PRIMARY
+    product._state.db = REPLICA
+    assert router.db_for_read(CategoryPage, instance=product) == REPLICA
+
+
+def test_reads_pinned_to_primary_after_write():
+    assert router.db_for_write(Basket) == PRIMARY
+    assert not has_written()
+    assert router.db_for_read(Sale) == REPLICA
+
+    assert router.db_for_write(Sale) == PRIMARY
+    assert has_written()
+    assert router.db_for_read(Sale) == PRIMARY
+    assert router.db_for_read(CategoryPage) == PRIMARY
+
+    reset_routing()
+    assert router.db_for_read(Sale) == REPLICA
+
+
+def test_migrations_not_run_on_replica():
+    assert router.allow_migrate(PRIMARY, "shop")
+    assert not router.allow_migrate(REPLICA, "shop")
+    assert router.allow_relation(Product(), ProductVariant())
+
+
+def read_db(request):
+    response = HttpResponse(router.db_for_read(Sale))
+    if request.method == "POST":
+        router.db_for_write(Sale)
+    return response
+
+
+@pytest.mark.parametrize(
+    "method, cookies, db",
+    [
+        ("get", {}, REPLICA),
+        ("get", {PIN_PRIMARY_COOKIE: "1"}, PRIMARY),
+        ("post", {}, PRIMARY),
+    ],
+)
+def test_replica_pinning_middleware(method, cookies, db):
+    request = getattr(RequestFactory(), method)("/")
+    request.COOKIES.update(cookies)
+    response = replica_pinning_middleware(read_db)(request)
+    assert response.content.decode() == db
+    assert (PIN_PRIMARY_COOKIE in response.cookies) == (method == "post")
+
+
+def test_replica_pinning_middleware_pins_following_requests(settings):
+    settings.DATABASE_REPLICA_PIN_SECONDS = 3
+    response = replica_pinning_middleware(read_db)(RequestFactory().post("/"))
+    assert response.cookies[PIN_PRIMARY_COOKIE]["max-age"] == 3
+
+
+def test_replica_pinning_middleware_under_asgi():
+    async def write(request):
+        router.db_for_write(Sale)
+        return HttpResponse()
+
+    middleware = replica_pinning_middleware(write)
+    response = async_to_sync(middleware)(RequestFactory().get("/"))
+    assert PIN_PRIMARY_COOKIE in response.cookies
+
+
+def test_cached_pages_rendered_from_primary(client, home_page):
+    client.get(home_page.url)
+    assert router.db_for_read(Sale) == PRIMARY
@@ -1,6 +1,7 @@
 import datetime
 
 from django.core import mail
+from django.template import Context, Template
 
 from model_bakery import baker
 
@@ -199,3 +200,36 @@ def test_page_menus(rf, home_page):
     # standard page1 has a dropdown menu that included standard page 2
     assert 'class="presentation testpage1 active has-submenu"' in content
     assert 'href="/test-page-1/test-page-2/' in content
+
+
+def test_footer_text_is_cached(rf, home_page, django_assert_num_queries):
+    FooterText.objects.create(body="I am a footer")
+    template = Template("{% load navigation_tags %}{% get_footer_text %}")
+    context = Context({"request": rf.get(home_page.url)})
+    assert "I am a footer" in template.render(context)
+    with django_assert_num_queries(0):
+        assert "I am a footer" in template.render(context)
+
+
+def test_footer_text_cache_cleared_on_publish_and_unpublish(rf, admin_user, home_page):
+    footer = FooterText.objects.create(body="I am a footer")
+    template = Template("{% load navigation_tags %}{% get_footer_text %}")
+    context = Context({"request": rf.get(home_page.url)})
+    assert "I am a footer" in template.render(context)
+
+    footer.body = "I am a new footer"
+    footer.save_revision(user=admin_user).publish()
+    assert "I am a new footer" in template.render(context)
+
+    footer.unpublish()
+    assert "I am a new footer" not in template.render(context)
+
+
+def test_footer_text_from_context_is_not_cached(rf, home_page):
+    FooterText.objects.create(body="I am a footer")
+    template = Template("{% load navigation_tags %}{% get_footer_text %}")
+    request = rf.get(home_page.url)
+    assert "I am a preview" in template.render(
+        Context({"request": request, "footer_text": "I am a preview"})
+    )
+    assert "I am a footer" in template.render(Context({"request": request}))
@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+from datetime import timezone as datetime_tz
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+from model_bakery import baker
+from wagtail.models import PageViewRestriction, Site
+
+from shop.models import ShopSettings
+
+from ..page_cache import page_cache_timeout
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client(client, home_page):
+    # Remove the site created by the initial migrations, so that requests are
+    # routed to the fixture site
+    Site.objects.exclude(root_page=home_page).delete()
+    yield client
+
+
+def path(page):
+    # page url relative to the site root
+    return page.get_url_parts()[2]
+
+
+def test_anonymous_page_is_cached(client, home_page, django_assert_num_queries):
+    resp = client.get(path(home_page))
+    assert resp.headers["X-Page-Cache"] == "MISS"
+
+    # only the expired basket check runs on a cache hit
+    with django_assert_num_queries(1):
+        cached_resp = client.get(path(home_page))
+    assert cached_resp.headers["X-Page-Cache"] == "HIT"
+    assert cached_resp.content == resp.content
+
+
+def test_cached_page_does_not_share_csrf_token(client, home_page):
+    resp = client.get(path(home_page))
+    assert resp.headers["X-Page-Cache"] == "MISS"
+    first_token = resp.cookies["csrftoken"].value
+
+    other_client = Client()
+    cached_resp = other_client.get(path(home_page))
+    assert cached_resp.headers["X-Page-Cache"] == "HIT"
+    # each visitor gets a token of their own, in the cookie only
+    other_token = cached_resp.cookies["csrftoken"].value
+    assert other_token != first_token
+    content = cached_resp.content.decode()
+    assert "X-CSRFToken" not in content
+    assert "csrfmiddlewaretoken" not in content
+
+
+def test_cached_page_served_under_asgi(client, asgi_get, home_page):
+    client.get(path(home_page))
+    assert asgi_get(path(home_page)).headers["X-Page-Cache"] == "HIT"
+
+
+def test_page_cache_cleared_on_publish(client, admin_user, home_page):
+    client.get(path(home_page))
+    assert client.get(path(home_page)).headers["X-Page-Cache"] == "HIT"
+
+    home_page.hero_text = "New hero text"
+    home_page.save_revision(user=admin_user).publish()
+    resp = client.get(path(home_page))
+    assert resp.headers["X-Page-Cache"] == "MISS"
+    assert "New hero text" in resp.content.decode()
+
+
+def test_page_cache_cleared_on_product_change(client, category_page, product):
+    client.get(path(category_page))
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "HIT"
+
+    baker.make("shop.ProductVariant", product=product, stock=3)
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "MISS"
+
+
+def test_page_cache_kept_on_basket_stock_change(client, category_page, basket):
+    variant = basket.items.first().product
+    client.get(path(category_page))
+    basket.add(variant, quantity=1)
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "HIT"
+    basket.items.first().delete()
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "HIT"
+
+
+def test_page_cache_cleared_when_variant_sells_out(client, category_page, basket):
+    variant = basket.items.first().product
+    client.get(path(category_page))
+    # 3 left in stock
+    basket.add(variant, quantity=3)
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "MISS"
+
+
+def test_page_cache_cleared_on_variant_price_change(client, category_page, basket):
+    variant = basket.items.first().product
+    client.get(path(category_page))
+    variant.price = 8
+    variant.save()
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "MISS"
+
+
+def test_page_cache_cleared_on_shop_settings_change(client, category_page, product):
+    # out of stock
+    baker.make("shop.ProductVariant", product=product, stock=0)
+    client.get(path(category_page))
+    assert client.get(path(category_page)).headers["X-Page-Cache"] == "HIT"
+
+    shop_settings = ShopSettings.load()
+    shop_settings.hide_out_of_stock = True
+    shop_settings.save()
+    resp = client.get(path(category_page))
+    assert resp.headers["X-Page-Cache"] == "MISS"
+    assert product.name not in resp.content.decode()
+
+
+def test_restricted_page_is_not_cached(client, home_page):
+    client.get(path(home_page))
+    assert client.get(path(home_page)).headers["X-Page-Cache"] == "HIT"
+
+    restriction = PageViewRestriction.objects.create(
+        page=home_page, restriction_type=PageViewRestriction.PASSWORD, password="pw"
+    )
+    # a visitor who has entered the password
+    session = client.session
+    session[PageViewRestriction.passed_view_restrictions_session_key] = [restriction.id]
+    session.save()
+    resp = client.get(path(home_page))
+    assert resp.status_code == 200
+    assert "X-Page-Cache" not in resp.headers
+
+    # other visitors get the password form
+    resp = Client().get(path(home_page))
+    assert "X-Page-Cache" not in resp.headers
+    assert 'name="password"' in resp.content.decode()
+
+
+def test_authenticated_page_is_not_cached(client, admin_user, home_page):
+    client.force_login(admin_user)
+    client.get(path(home_page))
+    assert "X-Page-Cache" not in client.get(path(home_page)).headers
+
+
+def test_page_with_messages_is_not_cached(client, home_page):
+    client.cookies["messages"] = "pending"
+    client.get(path(home_page))
+    assert "X-Page-Cache" not in client.get(path(home_page)).headers
+
+
+def test_page_cache_timeout(settings, freezer):
+    freezer.move_to(datetime(2022, 1, 1, 9, tzinfo=datetime_tz.utc))
+    assert page_cache_timeout() == settings.PAGE_CACHE_SECONDS
+    # cached pages expire when the next sale starts
+    baker.make(
+        "shop.Sale",
+        start_date=datetime(2022, 1, 1, 9, 5, tzinfo=datetime_tz.utc),
+        end_date=datetime(2022, 1, 2, tzinfo=datetime_tz.utc),
+    )
+    assert page_cache_timeout() == timedelta(minutes=5).total_seconds()
+
+
+def test_cached_shop_page_loads_basket_icon(client, shop_page):
+    content = client.get(path(shop_page)).content.decode()
+    assert f'hx-get="{reverse("shop:basket_icon")}"' in content
+    assert "fa-basket-shopping" not in content
+
+
+def test_cached_category_page_loads_stock(client, category_page):
+    product = baker.make("shop.Product", category_page=category_page, live=True)
+    variant = baker.make("shop.ProductVariant", product=product, live=True, stock=3)
+    client.get(path(category_page))
+    client.get(path(category_page))
+
+    # stock changes leave the page cached, so it doesn't show the stock
+    variant.stock = 2
+    variant.save()
+    resp = client.get(path(category_page))
+    assert resp.headers["X-Page-Cache"] == "HIT"
+    content = resp.content.decode()
+    assert f'<option value="{variant.id}">' in content
+    assert "in stock)" not in content
+    assert "data-stock=" not in content
+    assert f'hx-get="{reverse("shop:variant_stock")}"' in content
+    assert f'name="stock_product" value="{product.id}"' in content
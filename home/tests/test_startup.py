@@ -0,0 +1,36 @@
+import pytest
+
+
+# CPU seconds that django.setup() may take, imports included, in every web
+# worker and management command. It took 1.8s when it imported Stripe.
+SETUP_BUDGET = 1.2
+
+
+def test_django_setup_skips_payment_modules(profile_imports):
+    _, import_times = profile_imports("import django; django.setup()")
+    # only needed to handle requests, so loaded with the URLconf
+    assert "django" in import_times
+    assert not {"stripe", "salesman_stripe.payment", "httpx"} & set(import_times)
+
+
+@pytest.mark.benchmark
+def test_django_setup_budget(profile_imports):
+    # the fastest of a few runs, so that a busy machine doesn't fail the test
+    runs = [
+        profile_imports(
+            "import time; start = time.process_time(); "
+            "import django; django.setup(); "
+            "print(time.process_time() - start)"
+        )
+        for _ in range(3)
+    ]
+    output, import_times = min(runs, key=lambda run: float(run[0]))
+    slowest = list(import_times.items())[:10]
+    assert float(output) < SETUP_BUDGET, f"Slowest imports: {slowest}"
+
+
+def test_urlconf_imports_payment_modules(profile_imports):
+    _, import_times = profile_imports(
+        "import django; django.setup(); import pips_shop.urls"
+    )
+    assert {"stripe", "salesman_stripe.payment"} <= set(import_times)
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.template import engines
+
+from shop.breadcrumbs import CATEGORY_BREADCRUMBS_CACHE_KEY, SHOP_BREADCRUMBS_CACHE_KEY
+
+from ..breadcrumbs import BREADCRUMBS_CACHE_KEY
+from ..models import FOOTER_TEXT_CACHE_KEY
+from ..warmup import compile_templates, project_template_dirs, warm_up
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_project_template_dirs():
+    engine = engines["django"]
+    directories = list(project_template_dirs(engine))
+    assert Path(settings.PROJECT_DIR, "templates") in directories
+    assert Path(settings.BASE_DIR, "shop", "templates") in directories
+    # installed packages' templates are left out
+    assert len(directories) < len(engine.template_dirs)
+
+
+def test_compile_templates():
+    engine = engines["django"]
+    loader = engine.engine.template_loaders[0]
+    loader.reset()
+    compiled = compile_templates()
+    assert compiled == len(loader.get_template_cache)
+    assert "base.html" in loader.get_template_cache
+    assert "shop/basket.html" in loader.get_template_cache
+
+
+def test_warm_up(category_page):
+    assert warm_up() > 0
+    assert cache.get(BREADCRUMBS_CACHE_KEY.format(category_page.url_path))
+    assert cache.get(SHOP_BREADCRUMBS_CACHE_KEY)
+    assert category_page.id in cache.get(CATEGORY_BREADCRUMBS_CACHE_KEY)
+    assert cache.get(FOOTER_TEXT_CACHE_KEY) is not None
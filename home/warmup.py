@@ -0,0 +1,62 @@
+"""
+Warm up a process before it serves requests. Under gunicorn (see
+gunicorn.conf.py) this runs once, in the master process, after the application
+is loaded and before the workers are forked from it, so that every worker
+starts with the templates compiled, the URL patterns resolved and the shared
+caches filled.
+"""
+
+from pathlib import Path
+
+from django.conf import settings
+from django.template import engines
+from django.urls import reverse
+from wagtail.models import Site
+
+from shop.breadcrumbs import cache_shop_breadcrumbs
+
+from .breadcrumbs import cache_breadcrumbs
+from .templatetags.navigation_tags import get_live_footer_html
+
+
+def project_template_dirs(engine):
+    """
+    The engine's template directories in the project, leaving out those of
+    installed packages (such as the Wagtail admin's), which are compiled on
+    first use
+    """
+    base_dir = Path(settings.BASE_DIR)
+    for directory in map(Path, engine.template_dirs):
+        if base_dir in directory.parents and "site-packages" not in directory.parts:
+            yield directory
+
+
+def compile_templates():
+    """
+    Compile the project's templates into the engines' cached template loaders,
+    and return how many were compiled
+    """
+    compiled = 0
+    for engine in engines.all():
+        for directory in project_template_dirs(engine):
+            for path in sorted(directory.rglob("*.*")):
+                engine.get_template(path.relative_to(directory).as_posix())
+                compiled += 1
+    return compiled
+
+
+def prime_caches():
+    """Fill the navigation caches: breadcrumb trails and the footer text"""
+    for site in Site.objects.select_related("root_page"):
+        cache_breadcrumbs(site.root_page)
+    cache_shop_breadcrumbs()
+    get_live_footer_html()
+
+
+def warm_up():
+    """Warm up the process, and return the number of templates compiled"""
+    compiled = compile_templates()
+    # build the URL resolvers' lookup tables (and compile their patterns)
+    reverse("search")
+    prime_caches()
+    return compiled
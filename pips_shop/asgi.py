@@ -0,0 +1,25 @@
+"""
+ASGI config for pips_shop project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with uvicorn workers under gunicorn, e.g.
+``gunicorn pips_shop.asgi:application -k uvicorn.workers.UvicornWorker``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pips_shop.settings")
+# Under ASGI every request runs its synchronous code with a connection of its
+# own, which is never reused: a persistent connection would only be left open,
+# idle, after the request. Unless DATABASE_CONN_MAX_AGE is set in the
+# environment, connections are closed at the end of each request instead; to
+# save the cost of connecting, connect through a pooler (see DATABASE_POOLER).
+os.environ.setdefault("DATABASE_CONN_MAX_AGE", "0")
+
+application = get_asgi_application()
@@ -98,7 +98,10 @@ INSTALLED_APPS = [
     "wagtail",
     "modelcluster",
     "taggit",
-    "django.contrib.admin",
+    # Doesn't import the apps' admin modules on startup; pips_shop.urls does.
+    # Salesman's admin forms load the payment methods, and so Stripe, which
+    # management commands don't need.
+    "django.contrib.admin.apps.SimpleAdminConfig",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -119,7 +122,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise, able to run in an async (ASGI) middleware stack
+    "home.middleware.static_files_middleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -128,6 +132,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "wagtail.contrib.redirects.middleware.RedirectMiddleware",
     "shop.middleware.clear_expired_baskets_middleware",
+    "home.middleware.page_cache_middleware",
 ]
 
 ROOT_URLCONF = "pips_shop.urls"
@@ -162,6 +167,46 @@ DATABASES = {
     "default": env.db(),
     # Raises ImproperlyConfigured exception if DATABASE_URL not in os.environ
 }
+# Under WSGI (e.g. sync gunicorn workers), DATABASE_CONN_MAX_AGE keeps each
+# worker thread's connection open between requests, for 10 minutes by default,
+# so that requests don't pay for connecting (and the TLS and authentication
+# handshakes); stale connections are checked before they are reused. Each
+# thread then holds one connection, so the database must allow at least
+# workers x threads connections per app server, plus management commands.
+# Under ASGI connections aren't reused, so pips_shop/asgi.py defaults to closing
+# them after each request, and a pooler saves the cost of connecting.
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("DATABASE_CONN_MAX_AGE", 600)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool(
+    "DATABASE_CONN_HEALTH_CHECKS", True
+)
+# To connect through a pooler, run PgBouncer (or the database host's pooler) in
+# transaction pooling mode, point DATABASE_URL at it and set DATABASE_POOLER.
+# The server connection can then change between transactions, so server-side
+# cursors (used by QuerySet.iterator()) can't be used. Size the pooler's pool
+# for the total of all app servers' worker threads; the app's connections to
+# the pooler are cheap, and can be kept open with DATABASE_CONN_MAX_AGE.
+if env.bool("DATABASE_POOLER", False):  # pragma: no cover
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+# Catalogue, search and reporting reads can go to a read replica (see
+# home.db_router). After a request writes catalogue data, the same visitor's
+# requests read from the primary for DATABASE_REPLICA_PIN_SECONDS, which should
+# be longer than the replica lag. For local testing, the replica URL can be
+# the primary's URL, or a copy of the primary's database.
+DATABASE_REPLICA_PIN_SECONDS = env.int("DATABASE_REPLICA_PIN_SECONDS", 5)
+if env.str("DATABASE_REPLICA_URL", ""):  # pragma: no cover
+    DATABASES["replica"] = {
+        **env.db("DATABASE_REPLICA_URL"),
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": DATABASES["default"]["CONN_HEALTH_CHECKS"],
+        "DISABLE_SERVER_SIDE_CURSORS": DATABASES["default"].get(
+            "DISABLE_SERVER_SIDE_CURSORS", False
+        ),
+        # tests read the replica through the primary's connection
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["home.db_router.ReplicaRouter"]
+    MIDDLEWARE.insert(0, "home.middleware.replica_pinning_middleware")
 
 
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
@@ -441,6 +486,7 @@ WAGTAILADMIN_BASE_URL = f"https://{DOMAIN}"
 
 WAGTAILIMAGES_JPEG_QUALITY = 65
 WAGTAILIMAGES_WEBP_QUALITY = 65
+WAGTAILIMAGES_AVIF_QUALITY = 60
 
 # Salesman
 
@@ -486,3 +532,8 @@ SALESMAN_STRIPE_WEBHOOK_URL = "/stripe/webhook/"
 SALESMAN_STRIPE_PAID_STATUS = "PROCESSING"
 
 BASKET_TIMEOUT_MINUTES = env.int("BASKET_TIMEOUT_MINUTES", 15)
+# Variants with this many or fewer items in stock are reported as low stock
+LOW_STOCK_THRESHOLD = env.int("LOW_STOCK_THRESHOLD", 2)
+
+# Maximum time anonymous page views are served from the full-page cache
+PAGE_CACHE_SECONDS = env.int("PAGE_CACHE_SECONDS", 60 * 60)
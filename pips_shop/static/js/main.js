@@ -22,3 +22,73 @@ document.addEventListener('DOMContentLoaded', () => {
     toggleMobileNavigation();
   });
 });
+
+// Pages may be served from a cache shared by all visitors, so the CSRF token
+// rendered into them may not be the current visitor's; use the cookie instead
+function getCookie(name) {
+  const cookie = document.cookie
+    .split('; ')
+    .find((row) => row.startsWith(`${name}=`));
+  return cookie ? decodeURIComponent(cookie.split('=')[1]) : null;
+}
+
+document.body.addEventListener('htmx:configRequest', (event) => {
+  const csrfToken = getCookie('csrftoken');
+  if (csrfToken) {
+    event.detail.headers['X-CSRFToken'] = csrfToken;
+  }
+});
+
+// Quantity +/- steppers change the quantity field without a request to the
+// server. They stay within the stock rendered into the page: the selected
+// variant's data-stock on product cards, or the field's max in the basket.
+// Cached pages have no data-stock until the visitor's stock has been loaded.
+// Stock is checked again by the server when items are added or updated.
+function quantityBounds(input) {
+  const select = input.form?.querySelector('select[name="product_id"]');
+  const option = select?.selectedOptions[0];
+  const max = parseInt(option?.dataset.stock ?? input.getAttribute('max'), 10);
+  return {
+    min: parseInt(input.getAttribute('min'), 10) || 1,
+    max: Number.isNaN(max) ? Infinity : max,
+  };
+}
+
+function setQuantity(input, value) {
+  const { min, max } = quantityBounds(input);
+  const quantity = Math.max(Math.min(value, max), min);
+  if (quantity !== parseInt(input.value, 10)) {
+    input.value = quantity;
+    // the basket page sends its changes once the stepping has stopped
+    document.body.dispatchEvent(new CustomEvent('quantity-changed'));
+  }
+  return quantity;
+}
+
+document.body.addEventListener('click', (event) => {
+  const stepper = event.target.closest('[data-quantity-step]');
+  if (!stepper) {
+    return;
+  }
+  const input = document.getElementById(
+    stepper.getAttribute('aria-controls'),
+  );
+  const step = parseInt(stepper.dataset.quantityStep, 10);
+  const current = parseInt(input.value, 10) || 0;
+  const quantity = setQuantity(input, current + step);
+  const message = document.getElementById(stepper.dataset.quantityMessage);
+  if (message) {
+    const atMax = step > 0 && quantity <= current;
+    message.className = atMax ? 'alert-info' : '';
+    message.textContent = atMax ? "Can't increase quantity" : '';
+  }
+});
+
+// A different variant may have less stock than the quantity already chosen
+document.body.addEventListener('change', (event) => {
+  if (event.target.matches('select[name="product_id"]')) {
+    event.target.form
+      ?.querySelectorAll('input[name="quantity"]')
+      .forEach((input) => setQuantity(input, parseInt(input.value, 10) || 1));
+  }
+});
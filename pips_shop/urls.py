@@ -10,11 +10,19 @@ from shop import urls as shop_urls
 from shop.payment import stripe_webhook_view
 
 
+# See INSTALLED_APPS in pips_shop/settings.py
+admin.autodiscover()
+
 urlpatterns = [
     path("django-admin/", admin.site.urls),
     path("admin/", include(wagtailadmin_urls)),
     path("documents/", include(wagtaildocs_urls)),
     path("search/", search_views.search, name="search"),
+    path(
+        "search/autocomplete/",
+        search_views.autocomplete,
+        name="search_autocomplete",
+    ),
     path("shop/", include(shop_urls)),
     path("stripe/webhook/", stripe_webhook_view, name="shop-stripe-webhook"),
     path("api/", include("salesman.urls")),
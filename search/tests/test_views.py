@@ -1,5 +1,7 @@
 from django.urls import reverse
 
+from model_bakery import baker
+
 import pytest
 
 
@@ -32,3 +34,26 @@ def test_search_view_paginator(product, client, page):
     assert [pd.id for pd in resp.context_data["search_results"].object_list] == [
         product.id
     ]
+
+
+def test_autocomplete(product, client):
+    baker.make("shop.Product", category_page=product.category_page, name="Tester")
+    baker.make(
+        "shop.Product", category_page=product.category_page, name="Test", live=False
+    )
+    resp = client.get(reverse("search_autocomplete"), {"q": " tes "})
+    assert resp.content.decode().splitlines() == [
+        '<option value="Test Product"></option>',
+        '<option value="Tester"></option>',
+    ]
+
+
+@pytest.mark.parametrize("query", ["", "t"])
+def test_autocomplete_short_query(product, client, query):
+    resp = client.get(reverse("search_autocomplete"), {"q": query})
+    assert resp.content.decode().strip() == ""
+
+
+def test_autocomplete_under_asgi(product, asgi_get):
+    resp = asgi_get(reverse("search_autocomplete"), {"q": "product"})
+    assert resp.content.decode().strip() == '<option value="Test Product"></option>'
@@ -1,4 +1,6 @@
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import HttpResponse
+from django.template.loader import render_to_string
 from django.template.response import TemplateResponse
 
 from wagtail.models import Page
@@ -6,6 +8,11 @@ from wagtail.contrib.search_promotions.models import Query
 
 from shop.models import Product, ProductVariant, CategoryPage
 
+
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_LIMIT = 8
+
+
 def search(request):
     search_query = request.GET.get("q", None)
     page = request.GET.get("page", 1)
@@ -37,3 +44,24 @@ def search(request):
             "search_results": search_results,
         },
     )
+
+
+async def autocomplete(request):
+    """
+    Product name suggestions for the search inputs, loaded by htmx as the
+    visitor types. Rendered without a request context, so no context processors
+    (and no basket lookups) run for each keystroke.
+    """
+    search_query = request.GET.get("q", "").strip()
+    names = []
+    if len(search_query) >= AUTOCOMPLETE_MIN_LENGTH:
+        names = [
+            name
+            async for name in Product.objects.filter(
+                live=True, name__icontains=search_query
+            )
+            .order_by("name")
+            .values_list("name", flat=True)
+            .distinct()[:AUTOCOMPLETE_LIMIT]
+        ]
+    return HttpResponse(render_to_string("search/autocomplete.html", {"names": names}))
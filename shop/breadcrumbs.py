@@ -0,0 +1,54 @@
+from django.core.cache import cache
+
+from home.breadcrumbs import build_trails
+
+from .models import CategoryPage, ShopPage
+
+
+SHOP_BREADCRUMBS_CACHE_KEY = "breadcrumbs:shop"
+CATEGORY_BREADCRUMBS_CACHE_KEY = "breadcrumbs:categories"
+
+
+def _shop_trail():
+    shop_page = ShopPage.objects.order_by("-id").first()
+    if shop_page is None:
+        return []
+    return build_trails([shop_page])[shop_page.path]
+
+
+def _category_trails():
+    categories = list(CategoryPage.objects.all())
+    trails = build_trails(categories)
+    return {category.id: trails[category.path] for category in categories}
+
+
+def get_shop_breadcrumbs():
+    """Trail for the shop page, used for the basket, checkout and order pages"""
+    trail = cache.get(SHOP_BREADCRUMBS_CACHE_KEY)
+    if trail is None:
+        trail = _shop_trail()
+        cache.set(SHOP_BREADCRUMBS_CACHE_KEY, trail, None)
+    return trail
+
+
+def get_category_breadcrumbs(category_id):
+    """Trail for a category page, looked up from a map of all category trails"""
+    trails = cache.get(CATEGORY_BREADCRUMBS_CACHE_KEY)
+    if trails is None:
+        trails = _category_trails()
+        cache.set(CATEGORY_BREADCRUMBS_CACHE_KEY, trails, None)
+    return trails.get(category_id, [])
+
+
+def cache_shop_breadcrumbs():
+    cache.set_many(
+        {
+            SHOP_BREADCRUMBS_CACHE_KEY: _shop_trail(),
+            CATEGORY_BREADCRUMBS_CACHE_KEY: _category_trails(),
+        },
+        None,
+    )
+
+
+def clear_shop_breadcrumbs():
+    cache.delete_many([SHOP_BREADCRUMBS_CACHE_KEY, CATEGORY_BREADCRUMBS_CACHE_KEY])
@@ -0,0 +1,287 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import transaction
+
+from home.page_cache import clear_page_cache
+
+from .models import CategoryPage, Product, ProductVariant, update_inherited_prices
+from .stock import recount_product_stock
+
+
+# Columns in a catalogue file (CSV header, or JSON object keys). Each row is a
+# product variant; its product is identified by category and product name, and
+# the variant by its name, colour and size within the product. Optional
+# columns that are left out are not changed for existing rows.
+CATALOGUE_COLUMNS = [
+    "category",
+    "product",
+    "product_price",
+    "description",
+    "index",
+    "product_live",
+    "variant",
+    "colour",
+    "size",
+    "price",
+    "stock",
+    "live",
+]
+
+# catalogue column: model field
+PRODUCT_COLUMNS = {
+    "product_price": "price",
+    "description": "description",
+    "index": "index",
+    "product_live": "live",
+}
+VARIANT_COLUMNS = {"price": "price", "stock": "stock", "live": "live"}
+
+TRUE_VALUES = {"true", "yes", "y", "1"}
+FALSE_VALUES = {"false", "no", "n", "0"}
+
+
+def read_catalogue(path, file_format=None):
+    """Read the rows of a CSV or JSON catalogue file, as dicts"""
+    path = Path(path)
+    file_format = file_format or path.suffix.lstrip(".").lower()
+    with path.open(newline="", encoding="utf-8-sig") as catalogue_file:
+        if file_format == "json":
+            return json.load(catalogue_file)
+        if file_format == "csv":
+            return list(csv.DictReader(catalogue_file))
+    raise ValueError(f"Unknown catalogue format '{file_format}'; use csv or json")
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def _optional(value):
+    # blank variant names, colours and sizes are stored as null
+    return _text(value) or None
+
+
+def _decimal(value):
+    try:
+        return Decimal(_text(value))
+    except InvalidOperation:
+        raise ValueError(f"'{value}' is not a valid price")
+
+
+def _integer(value):
+    try:
+        return int(_text(value))
+    except ValueError:
+        raise ValueError(f"'{value}' is not a whole number")
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if _text(value).lower() in TRUE_VALUES:
+        return True
+    if _text(value).lower() in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{value}' is not true or false")
+
+
+PARSERS = {
+    "product_price": _decimal,
+    "description": _text,
+    "index": _integer,
+    "product_live": _boolean,
+    "price": _decimal,
+    "stock": _integer,
+    "live": _boolean,
+}
+
+
+class CatalogueImport:
+    """
+    Validate catalogue rows and work out the products and variants to create or
+    update. Existing products, variants and category pages are loaded up front,
+    so validating a file makes a fixed number of queries however long it is.
+    """
+
+    def __init__(self):
+        self.categories = {}
+        for category in CategoryPage.objects.only("id", "title", "slug"):
+            self.categories[category.slug] = category
+            self.categories.setdefault(category.title.lower(), category)
+        self.products = {}
+        products_by_id = {}
+        for product in Product.objects.order_by("-id"):
+            self.products[(product.category_page_id, product.name)] = product
+            products_by_id[product.id] = product
+        self.variants = {}
+        self.next_sort_order = {}
+        for variant in ProductVariant.objects.order_by("-id"):
+            # share the product instances, for the default price
+            variant.product = products_by_id[variant.product_id]
+            self.variants[
+                (variant.product_id, variant.variant_name, variant.colour, variant.size)
+            ] = variant
+            self.next_sort_order[variant.product_id] = max(
+                self.next_sort_order.get(variant.product_id, 0),
+                (variant.sort_order or 0) + 1,
+            )
+        self.errors = []
+        # (product or variant, {field: (old value, new value)}), keyed by id();
+        # new model instances aren't hashable until they are saved
+        self.changes = {}
+        self.inheriting_variants = []
+
+    def add_rows(self, rows):
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                self.add_row(row)
+            except ValueError as error:
+                self.errors.append(f"Row {row_number}: {error}")
+        # Variants without a price use their product's price, as set by the
+        # update_price signal when variants are saved individually
+        for variant in self.inheriting_variants:
+            self._set(variant, "price", variant.product.price)
+
+    def add_row(self, row):
+        unknown_columns = set(row) - set(CATALOGUE_COLUMNS)
+        if unknown_columns:
+            raise ValueError(f"Unknown columns {', '.join(sorted(unknown_columns))}")
+        values = {
+            column: PARSERS[column](row[column])
+            for column in PARSERS
+            if column in row and not (column == "price" and _text(row[column]) == "")
+        }
+        # a blank variant price means "use the product price"
+        inherit_price = "price" in row and "price" not in values
+        category = self.categories.get(_text(row.get("category")).lower())
+        if category is None:
+            raise ValueError(f"Unknown category '{_text(row.get('category'))}'")
+        product_name = _text(row.get("product"))
+        if not product_name:
+            raise ValueError("Product name is required")
+
+        product = self.products.get((category.id, product_name))
+        if product is None:
+            product = Product(category_page=category, name=product_name)
+            self.products[(category.id, product_name)] = product
+            self.changes[id(product)] = (product, {})
+        for column, field in PRODUCT_COLUMNS.items():
+            if column in values:
+                self._set(product, field, values[column])
+
+        variant_key = (
+            _optional(row.get("variant")),
+            _optional(row.get("colour")),
+            _optional(row.get("size")),
+        )
+        # new products don't have an id yet, so their variants are keyed by
+        # the product's id()
+        product_key = product.pk or ("new", id(product))
+        variant = self.variants.get((product_key, *variant_key))
+        if variant is None:
+            variant = ProductVariant(
+                product=product,
+                variant_name=variant_key[0],
+                colour=variant_key[1],
+                size=variant_key[2],
+                sort_order=self.next_sort_order.get(product_key, 0),
+            )
+            self.next_sort_order[product_key] = variant.sort_order + 1
+            self.variants[(product_key, *variant_key)] = variant
+            self.changes[id(variant)] = (variant, {})
+        for column, field in VARIANT_COLUMNS.items():
+            if column in values:
+                self._set(variant, field, values[column])
+        if "price" in values:
+            self._set(variant, "inherit_price", False)
+        elif inherit_price or variant.price is None:
+            self._set(variant, "inherit_price", True)
+        if variant.inherit_price:
+            self.inheriting_variants.append(variant)
+
+    def _set(self, obj, field, value):
+        old_value = getattr(obj, field)
+        if old_value != value:
+            setattr(obj, field, value)
+            if obj.pk:
+                _, changes = self.changes.setdefault(id(obj), (obj, {}))
+                changes[field] = (changes.get(field, (old_value,))[0], value)
+
+    def _changed(self, model):
+        return [
+            obj
+            for obj, changes in self.changes.values()
+            if isinstance(obj, model) and obj.pk and changes
+        ]
+
+    def _created(self, model):
+        return [
+            obj
+            for obj, _ in self.changes.values()
+            if isinstance(obj, model) and obj.pk is None
+        ]
+
+    def diff(self):
+        """Lines describing each product and variant to be created or changed"""
+        for obj, changes in self.changes.values():
+            label = "Product" if isinstance(obj, Product) else "Variant"
+            if obj.pk is None:
+                yield f"+ {label} {obj}"
+            elif changes:
+                changed = ", ".join(
+                    f"{field} {old} -> {new}" for field, (old, new) in changes.items()
+                )
+                yield f"~ {label} {obj}: {changed}"
+
+    def summary(self):
+        return (
+            f"Products: {len(self._created(Product))} created, "
+            f"{len(self._changed(Product))} updated. "
+            f"Variants: {len(self._created(ProductVariant))} created, "
+            f"{len(self._changed(ProductVariant))} updated."
+        )
+
+    @transaction.atomic
+    def save(self, batch_size=1000):
+        """
+        Write the new and changed products and variants in batches. Rows are
+        written with bulk_create, so model signals are not sent; the products'
+        stock counters are recounted, and the page cache is cleared once the
+        import has been committed.
+        """
+        # Upserts on the primary key; new rows are inserted separately so that
+        # their ids are set (the ids of upserted rows are not returned)
+        Product.objects.bulk_create(self._created(Product), batch_size=batch_size)
+        Product.objects.bulk_create(
+            self._changed(Product),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=list(PRODUCT_COLUMNS.values()),
+        )
+        repriced_products = [
+            product
+            for product, changes in self.changes.values()
+            if isinstance(product, Product) and "price" in changes
+        ]
+        if repriced_products:
+            # including variants that aren't in the catalogue file
+            update_inherited_prices(repriced_products)
+        created_variants = self._created(ProductVariant)
+        changed_variants = self._changed(ProductVariant)
+        ProductVariant.objects.bulk_create(created_variants, batch_size=batch_size)
+        ProductVariant.objects.bulk_create(
+            changed_variants,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[*VARIANT_COLUMNS.values(), "inherit_price"],
+        )
+        if created_variants or changed_variants:
+            recount_product_stock(
+                {variant.product_id for variant in created_variants + changed_variants}
+            )
+        transaction.on_commit(clear_page_cache)
@@ -1,12 +1,16 @@
 from os import environ
 
+from django.utils.functional import SimpleLazyObject
+
 from .models import Sale
 from .views import get_basket_quantity
 
 
 def shop_context(request):
+    # Values are evaluated on first access in a template, so htmx partials that
+    # never use them don't pay for the basket and sale lookups
     return {
-        "basket_quantity": get_basket_quantity(request),
+        "basket_quantity": SimpleLazyObject(lambda: get_basket_quantity(request)),
         "hide_search": environ.get("HIDE_SEARCH", False),
-        "current_sale": Sale.current_sale(),
+        "current_sale": SimpleLazyObject(Sale.current_sale),
     }
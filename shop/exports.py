@@ -0,0 +1,161 @@
+import csv
+from tempfile import TemporaryFile
+
+from django.db.models import Prefetch
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from salesman.core.utils import get_salesman_model
+
+
+Order = get_salesman_model("Order")
+OrderItem = get_salesman_model("OrderItem")
+OrderPayment = get_salesman_model("OrderPayment")
+OrderNote = get_salesman_model("OrderNote")
+
+# Orders are read from a server-side cursor in chunks, with their items, payments
+# and notes prefetched per chunk, so memory use doesn't grow with the number of
+# orders exported
+EXPORT_CHUNK_SIZE = 500
+
+# Spreadsheet programs run cells that start with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+HEADERS = [
+    "Order ref",
+    "Order date",
+    "Status",
+    "Name",
+    "Email",
+    "Shipping method",
+    "Order subtotal",
+    "Order total",
+    "Record",
+    "Date",
+    "Description",
+    "Code",
+    "Quantity",
+    "Unit price",
+    "Amount",
+    "Reference",
+]
+
+
+def get_export_queryset(orders):
+    """The orders to export, from the order admin listing's queryset"""
+    return orders.order_by("date_created", "id").prefetch_related(
+        Prefetch("items", queryset=OrderItem.objects.order_by("id")),
+        Prefetch("payments", queryset=OrderPayment.objects.order_by("id")),
+        Prefetch("notes", queryset=OrderNote.objects.order_by("id")),
+    )
+
+
+def _local(date):
+    return timezone.localtime(date).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def order_rows(orders):
+    """
+    Yield rows for the export; one row for each order, followed by a row for each
+    of its items, payments and notes
+    """
+    yield HEADERS
+    for order in orders.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        order_columns = [
+            order.ref,
+            _local(order.date_created),
+            order.status_display,
+            order.name,
+            order.email,
+            order.get_shipping_method_display(),
+            order.subtotal,
+            order.total,
+        ]
+        yield order_columns + ["order", _local(order.date_created)] + [""] * 6
+        for item in order.items.all():
+            yield order_columns + [
+                "item",
+                "",
+                item.product_data.get("name", ""),
+                item.product_data.get("code", ""),
+                item.quantity,
+                item.unit_price,
+                item.total,
+                "",
+            ]
+        for payment in order.payments.all():
+            yield order_columns + [
+                "payment",
+                _local(payment.date_created),
+                payment.payment_method,
+                "",
+                "",
+                "",
+                payment.amount,
+                payment.transaction_id,
+            ]
+        for note in order.notes.all():
+            yield order_columns + [
+                "note",
+                _local(note.date_created),
+                note.message,
+                "",
+                "",
+                "",
+                "",
+                "public" if note.public else "",
+            ]
+
+
+def _escape_formula(value):
+    # Customers' names, emails and notes are exported as they were entered
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def spreadsheet_rows(orders):
+    """The export rows, with text that would run as a formula escaped"""
+    for row in order_rows(get_export_queryset(orders)):
+        yield [_escape_formula(value) for value in row]
+
+
+class Echo:
+    """A file-like object for csv.writer that returns each written row"""
+
+    def write(self, value):
+        return value
+
+
+def _filename(file_format):
+    return f"orders-{timezone.localdate().isoformat()}.{file_format}"
+
+
+def export_orders_csv(orders):
+    writer = csv.writer(Echo())
+    return StreamingHttpResponse(
+        (writer.writerow(row) for row in spreadsheet_rows(orders)),
+        content_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{_filename("csv")}"'},
+    )
+
+
+def export_orders_xlsx(orders):
+    # A write-only workbook keeps only the current row in memory; the finished
+    # file is streamed from disk
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Orders")
+    for row in spreadsheet_rows(orders):
+        worksheet.append(row)
+    output = TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=_filename("xlsx"),
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+EXPORTERS = {"csv": export_orders_csv, "xlsx": export_orders_xlsx}
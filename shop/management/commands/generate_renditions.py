@@ -0,0 +1,55 @@
+import os
+from multiprocessing import get_context
+
+import django
+from django.core.management.base import BaseCommand
+
+from shop.models import Product, ProductVariant
+from shop.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Generate any missing renditions for product and product variant images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=20,
+            help="Number of images handled by a worker at a time",
+        )
+
+    def handle(self, processes, chunk_size, **options):
+        image_ids = sorted(
+            set(
+                Product.objects.filter(image__isnull=False).values_list(
+                    "image_id", flat=True
+                )
+            )
+            | set(
+                ProductVariant.objects.filter(image__isnull=False).values_list(
+                    "image_id", flat=True
+                )
+            )
+        )
+        chunks = [
+            image_ids[i : i + chunk_size] for i in range(0, len(image_ids), chunk_size)
+        ]
+        if processes > 1 and len(chunks) > 1:
+            # Spawned (rather than forked) workers set up django and open their
+            # own database connections
+            with get_context("spawn").Pool(
+                min(processes, len(chunks)), initializer=django.setup
+            ) as pool:
+                count = sum(pool.imap_unordered(generate_renditions, chunks))
+        else:
+            count = sum(map(generate_renditions, chunks))
+        self.stdout.write(
+            f"Generated renditions for {count} of {len(image_ids)} product images"
+        )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from shop.catalogue import CATALOGUE_COLUMNS, CatalogueImport, read_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products and product variants from a CSV or JSON "
+        f"catalogue file. Columns: {', '.join(CATALOGUE_COLUMNS)}"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the catalogue file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "json"],
+            help="File format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the changes that would be made, without saving them",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows written per query",
+        )
+
+    def handle(self, path, format, dry_run, batch_size, **options):
+        try:
+            rows = read_catalogue(path, format)
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        catalogue_import = CatalogueImport()
+        catalogue_import.add_rows(rows)
+        if catalogue_import.errors:
+            raise CommandError(
+                "No changes saved; the catalogue has errors:\n"
+                + "\n".join(catalogue_import.errors)
+            )
+
+        summary = catalogue_import.summary()
+        if dry_run:
+            for line in catalogue_import.diff():
+                self.stdout.write(line)
+            self.stdout.write(f"Dry run, no changes saved. {summary}")
+            return
+        try:
+            catalogue_import.save(batch_size=batch_size)
+        except IntegrityError as error:
+            raise CommandError(f"No changes saved: {error}")
+        self.stdout.write(summary)
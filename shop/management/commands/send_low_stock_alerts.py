@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+
+from shop.models import ProductVariant
+from shop.signals import get_email_settings
+from shop.stock import is_low_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Email a digest of product variants that have reached the low stock "
+        "threshold since the last digest. Intended to be run periodically."
+    )
+
+    @transaction.atomic
+    def handle(self, **options):
+        pending = list(
+            ProductVariant.objects.filter(low_stock_alert_pending=True)
+            .select_related("product")
+            .select_for_update(of=("self",))
+            .order_by("stock", "id")
+        )
+        # stock may have been replenished since the variant was flagged
+        low_stock = [
+            variant
+            for variant in pending
+            if variant.live and is_low_stock(variant.stock)
+        ]
+        notify_emails, reply_to = get_email_settings()
+        if low_stock and notify_emails:
+            report_url = settings.WAGTAILADMIN_BASE_URL + reverse("low_stock_report")
+            lines = [
+                f"- {variant.name}: {variant.stock} in stock" for variant in low_stock
+            ]
+            plural = "s" if len(low_stock) != 1 else ""
+            EmailMessage(
+                f"Low stock: {len(low_stock)} product variant{plural}",
+                "These product variants are running low:\n"
+                + "\n".join(lines)
+                + f"\n\nView all low stock items: {report_url}",
+                settings.DEFAULT_FROM_EMAIL,
+                notify_emails,
+                reply_to=reply_to,
+            ).send()
+        ProductVariant.objects.filter(
+            id__in=[variant.id for variant in pending]
+        ).update(low_stock_alert_pending=False)
+        self.stdout.write(f"{len(low_stock)} low stock variants reported")
@@ -1,16 +1,28 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.decorators import sync_and_async_middleware
+
 from salesman.core.utils import get_salesman_model
 
 Basket = get_salesman_model("Basket")
 
 
+@sync_and_async_middleware
 def clear_expired_baskets_middleware(get_response):
-    # One-time configuration and initialization.
-
-    def middleware(request):
-        # Clear expired baskets before any non-htmx view is called
-        if "Hx-Request" not in request.headers:
-            Basket.clear_expired()
-        response = get_response(request)
-        return response
+    # Clear expired baskets before any non-htmx view is called
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            if "Hx-Request" not in request.headers:
+                await sync_to_async(Basket.clear_expired)()
+            return await get_response(request)
+
+    else:
+
+        def middleware(request):
+            if "Hx-Request" not in request.headers:
+                Basket.clear_expired()
+            response = get_response(request)
+            return response
 
     return middleware
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0029_alter_sale_banner_include_end_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productvariant",
+            name="low_stock_alert_pending",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="productvariant",
+            index=models.Index(fields=["live", "stock"], name="variant_live_stock_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productvariant",
+            index=models.Index(
+                condition=models.Q(("low_stock_alert_pending", True)),
+                fields=["low_stock_alert_pending"],
+                name="variant_low_stock_alert_idx",
+            ),
+        ),
+    ]
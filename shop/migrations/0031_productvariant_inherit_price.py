@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0030_productvariant_low_stock"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productvariant",
+            name="inherit_price",
+            field=models.BooleanField(
+                default=False,
+                help_text="Keep this variant's price the same as the product's default price. Set automatically if the price is left blank, and cleared if a different price is entered.",
+                verbose_name="Use product price",
+            ),
+        ),
+    ]
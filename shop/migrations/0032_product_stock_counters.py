@@ -0,0 +1,78 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:32
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_product_stock(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductVariant = apps.get_model("shop", "ProductVariant")
+    live_variants = (
+        ProductVariant.objects.filter(product=models.OuterRef("pk"), live=True)
+        .order_by()
+        .values("product")
+    )
+    Product.objects.update(
+        total_stock=Coalesce(
+            models.Subquery(
+                live_variants.annotate(total=models.Sum("stock")).values("total")
+            ),
+            0,
+        ),
+        live_variant_count=Coalesce(
+            models.Subquery(
+                live_variants.annotate(count=models.Count("pk")).values("count")
+            ),
+            0,
+        ),
+        in_stock_variant_count=Coalesce(
+            models.Subquery(
+                live_variants.filter(stock__gt=0)
+                .annotate(count=models.Count("pk"))
+                .values("count")
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0031_productvariant_inherit_price"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="in_stock_variant_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="live_variant_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="total_stock",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="shopsettings",
+            name="hide_out_of_stock",
+            field=models.BooleanField(
+                default=False,
+                help_text="Hide products with no live variants in stock from category pages.",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("in_stock_variant_count__gt", 0), ("live", True)),
+                fields=["category_page", "index"],
+                name="product_in_stock_idx",
+            ),
+        ),
+        migrations.RunPython(count_product_stock, migrations.RunPython.noop),
+    ]
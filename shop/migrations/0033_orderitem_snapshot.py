@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+
+def add_order_item_snapshots(apps, schema_editor):
+    # As ProductVariant.order_snapshot(), from the variants as they are now;
+    # items whose variant has been deleted keep the name stored with them
+    OrderItem = apps.get_model("shop", "OrderItem")
+    ProductVariant = apps.get_model("shop", "ProductVariant")
+    items = OrderItem.objects.exclude(product_data__has_key="identifier")
+    variants = ProductVariant.objects.select_related("product__category_page").in_bulk(
+        {item.product_id for item in items}
+    )
+    for item in items:
+        variant = variants.get(item.product_id)
+        if variant is None:
+            continue
+        product = variant.product
+        variant_name = ", ".join(
+            name for name in (variant.colour, variant.size) if name
+        )
+        if variant.variant_name:
+            variant_name = " - ".join(
+                name for name in (variant.variant_name, variant_name) if name
+            )
+        item.product_data.update(
+            {
+                "identifier": slugify(f"{product.category_page.title}-{product.name}"),
+                "product_type": product.name,
+                "category": product.category_page.title,
+                "variant_name": variant_name,
+            }
+        )
+        item.save(update_fields=["product_data"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0032_product_stock_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_order_item_snapshots, migrations.RunPython.noop),
+    ]
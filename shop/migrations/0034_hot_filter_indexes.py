@@ -0,0 +1,40 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0033_orderitem_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="basket",
+            index=models.Index(
+                condition=models.Q(("timeout__isnull", False)),
+                fields=["timeout"],
+                name="basket_timeout_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category_page", "live", "index"],
+                name="product_category_live_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productvariant",
+            index=models.Index(
+                condition=models.Q(("live", True)),
+                fields=["product", "sort_order"],
+                name="variant_product_live_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(fields=["start_date"], name="sale_start_date_idx"),
+        ),
+    ]
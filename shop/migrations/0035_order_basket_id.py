@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:00
+
+from django.db import migrations, models
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+
+def set_basket_ids(apps, schema_editor):
+    # The basket id was stored in the order's extra data
+    Order = apps.get_model("shop", "Order")
+    Order.objects.filter(_extra__has_key="basket_id").update(
+        basket_id=Cast(
+            KeyTextTransform("basket_id", "_extra"), models.PositiveIntegerField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0034_hot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="basket_id",
+            field=models.PositiveIntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(set_basket_ids, migrations.RunPython.noop),
+    ]
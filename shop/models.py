@@ -10,6 +10,7 @@ from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.safestring import mark_safe
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, cached_property
 from salesman.basket.models import BaseBasket, BaseBasketItem
 from salesman.orders.models import (
     BaseOrder,
@@ -17,7 +18,7 @@ from salesman.orders.models import (
     BaseOrderNote,
     BaseOrderPayment,
 )
-from modelcluster.models import ClusterableModel, ParentalKey
+from modelcluster.models import ClusterableModel, ParentalKey, get_all_child_relations
 from wagtail.admin.panels import FieldPanel, InlinePanel, HelpPanel, MultiFieldPanel
 from wagtail.contrib.forms.models import validate_to_address
 from wagtail.contrib.settings.models import (
@@ -25,8 +26,13 @@ from wagtail.contrib.settings.models import (
     register_setting,
 )
 from wagtail.fields import RichTextField
+from wagtail.images import get_image_model
 from wagtail.models import Page, Orderable
 
+from home.page_cache import CachedPageMixin
+
+from .renditions import product_image_filter_specs
+
 
 # ORDERS
 
@@ -41,6 +47,11 @@ class Order(BaseOrder):
     shipping_method = models.CharField(
         choices=tuple(SHIPPING_METHODS.items()), default="collect"
     )
+    # The basket the order was created from; when the basket is deleted, its
+    # items are put back in stock and the ordered items taken out again
+    basket_id = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, db_index=True
+    )
 
     @transaction.atomic
     def populate_from_basket(
@@ -50,13 +61,19 @@ class Order(BaseOrder):
         **kwargs,
     ) -> None:
         basket.extra["basket_id"] = basket.id
+        self.basket_id = basket.id
         self.name = basket.extra.pop("name", "")
         self.shipping_method = basket.shipping_method
         return super().populate_from_basket(basket, request, **kwargs)
 
 
 class OrderItem(BaseOrderItem):
-    pass
+    def populate_from_basket_item(self, item, request):
+        super().populate_from_basket_item(item, request)
+        # Order status pages are rendered from the stored product data, so they
+        # show the items as they were ordered, even if the products have since
+        # been renamed or deleted
+        self.product_data.update(item.product.order_snapshot())
 
 
 class OrderPayment(BaseOrderPayment):
@@ -76,6 +93,17 @@ class Basket(BaseBasket):
     )
     timeout = models.DateTimeField(null=True)
 
+    class Meta(BaseBasket.Meta):
+        indexes = [
+            # for clear_expired, which runs on every request; baskets without a
+            # timeout are never expired
+            models.Index(
+                fields=["timeout"],
+                name="basket_timeout_idx",
+                condition=models.Q(timeout__isnull=False),
+            ),
+        ]
+
     def update(self, request):
         super().update(request)
         self.reset_timeout()
@@ -85,7 +113,7 @@ class Basket(BaseBasket):
         self.timeout = timezone.now() + timedelta(
             minutes=settings.BASKET_TIMEOUT_MINUTES
         )
-        self.save()
+        self.save(update_fields=["timeout"])
 
     @classmethod
     def clear_expired(cls):
@@ -105,7 +133,7 @@ class BasketItem(BaseBasketItem):
 # PRODUCTS
 
 
-class CategoryPage(Page):
+class CategoryPage(CachedPageMixin, Page):
     body = RichTextField(
         verbose_name="Page body",
         blank=True,
@@ -131,19 +159,27 @@ class CategoryPage(Page):
     @property
     def live_products(self):
         # products are live if they are set to live AND have at least one live variants
-        return (
-            self.page_products.filter(
-                live=True, variants__isnull=False, variants__live=True
-            )
-            .order_by("index")
-            .distinct()
+        return self.page_products.filter(live=True, live_variant_count__gt=0).order_by(
+            "index"
         )
 
+    @cached_property
+    def listed_products(self):
+        # live products, with their images and renditions fetched for the listing
+        products = self.live_products
+        if ShopSettings.load().hide_out_of_stock:
+            products = products.filter(in_stock_variant_count__gt=0)
+        return prefetch_product_images(products, "card")
+
     class Meta:
         verbose_name = "Category"
         verbose_name_plural = "Categories"
 
 
+# Product fields maintained from its variants, see shop.stock
+STOCK_COUNTERS = ["total_stock", "live_variant_count", "in_stock_variant_count"]
+
+
 class Product(ClusterableModel):
     """
     Product, used to subgroup products in display.
@@ -176,6 +212,26 @@ class Product(ClusterableModel):
         default=True, help_text="Display this product in the shop"
     )
 
+    # Counters for the product's live variants, kept up to date by the variant
+    # signals (see shop.stock) so that listings don't need to query variants
+    total_stock = models.IntegerField(default=0, editable=False)
+    live_variant_count = models.IntegerField(default=0, editable=False)
+    in_stock_variant_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # live_products
+            models.Index(
+                fields=["category_page", "live", "index"],
+                name="product_category_live_idx",
+            ),
+            models.Index(
+                fields=["category_page", "index"],
+                name="product_in_stock_idx",
+                condition=models.Q(live=True, in_stock_variant_count__gt=0),
+            ),
+        ]
+
     panels = [
         HelpPanel(
             """
@@ -217,8 +273,19 @@ class Product(ClusterableModel):
     def __str__(self):
         return self.name
 
+    def save(self, **kwargs):
+        # The stock counters are only changed by UPDATEs from the variant signals;
+        # don't overwrite them with the values this instance was loaded with
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in STOCK_COUNTERS
+            ] + [rel.get_accessor_name() for rel in get_all_child_relations(self)]
+        super().save(**kwargs)
+
     def get_variant_count(self):
-        return f"{self.live_variants.count()} live ({self.variants.count()} total)"
+        return f"{self.live_variant_count} live ({self.variants.count()} total)"
 
     get_variant_count.short_description = "# variants"
 
@@ -227,9 +294,7 @@ class Product(ClusterableModel):
         return self.variants.filter(live=True)
 
     def out_of_stock(self):
-        if self.variants.exists():
-            return self.variants.aggregate(models.Sum("stock"))["stock__sum"] <= 0
-        return True
+        return self.in_stock_variant_count <= 0
 
     @property
     def identifier(self):
@@ -244,6 +309,8 @@ class Product(ClusterableModel):
 
     @property
     def images(self):
+        if hasattr(self, "_prefetched_images"):
+            return self._prefetched_images
         all_images = list()
         if self.image:
             all_images.append(self.image)
@@ -279,6 +346,15 @@ class ProductVariant(Orderable):
         decimal_places=2,
         help_text="Leave blank to use default product price.",
     )
+    inherit_price = models.BooleanField(
+        default=False,
+        verbose_name="Use product price",
+        help_text=(
+            "Keep this variant's price the same as the product's default price. "
+            "Set automatically if the price is left blank, and cleared if a "
+            "different price is entered."
+        ),
+    )
     stock = models.IntegerField(
         default=1, help_text="Quantity of this item currently in stock"
     )
@@ -289,8 +365,26 @@ class ProductVariant(Orderable):
     colour = models.CharField(null=True, blank=True)
     size = models.CharField(null=True, blank=True)
 
+    # Set when stock drops to the low stock threshold; cleared once the variant
+    # has been included in a low stock digest email
+    low_stock_alert_pending = models.BooleanField(default=False, editable=False)
+
     class Meta:
         unique_together = ("variant_name", "colour", "size")
+        indexes = [
+            # live_variants, in order
+            models.Index(
+                fields=["product", "sort_order"],
+                name="variant_product_live_idx",
+                condition=models.Q(live=True),
+            ),
+            models.Index(fields=["live", "stock"], name="variant_live_stock_idx"),
+            models.Index(
+                fields=["low_stock_alert_pending"],
+                name="variant_low_stock_alert_idx",
+                condition=models.Q(low_stock_alert_pending=True),
+            ),
+        ]
 
     def __str__(self):
         product_name = self.product.name
@@ -302,6 +396,14 @@ class ProductVariant(Orderable):
     def name(self):
         return str(self)
 
+    def order_snapshot(self):
+        return {
+            "identifier": self.product.identifier,
+            "product_type": self.product.name,
+            "category": self.product.category_page.title,
+            "variant_name": self.variant_full_name(),
+        }
+
     def variant_full_name(self):
         name = self.variant_name or ""
         if name and (self.colour or self.size):
@@ -370,7 +472,51 @@ class ProductVariant(Orderable):
         return str(self.id)
 
 
-class ShopPage(Page):
+def update_inherited_prices(products):
+    """
+    Set the prices of variants that use their product's price, in a single UPDATE
+    """
+    return ProductVariant.objects.filter(
+        product__in=products, inherit_price=True
+    ).update(
+        price=models.Subquery(
+            Product.objects.filter(pk=models.OuterRef("product_id")).values("price")
+        )
+    )
+
+
+def prefetch_product_images(products, *sizes):
+    """
+    Fetch the images for a list of products, along with their renditions for the
+    given sizes (see shop.renditions), in a fixed number of queries. Returns the
+    products as a list, with the images stored for Product.images
+    """
+    products = list(products)
+    variants = ProductVariant.objects.filter(
+        product__in=products, live=True, image__isnull=False
+    ).order_by("sort_order").values_list("product_id", "image_id")
+    image_ids_by_product = {
+        product.id: [product.image_id] if product.image_id else []
+        for product in products
+    }
+    for product_id, image_id in variants:
+        if image_id not in image_ids_by_product[product_id]:
+            image_ids_by_product[product_id].append(image_id)
+    images = (
+        get_image_model()
+        .objects.prefetch_renditions(
+            *(spec for size in sizes for spec in product_image_filter_specs(size))
+        )
+        .in_bulk({image_id for ids in image_ids_by_product.values() for image_id in ids})
+    )
+    for product in products:
+        product._prefetched_images = [
+            images[image_id] for image_id in image_ids_by_product[product.id]
+        ]
+    return products
+
+
+class ShopPage(CachedPageMixin, Page):
     introduction = models.TextField(help_text="Text to describe the page", blank=True)
     image = models.ForeignKey(
         "wagtailimages.Image",
@@ -401,7 +547,9 @@ class ShopPage(Page):
         from .views import get_basket_quantity
 
         context = super().get_context(request)
-        context["basket_quantity"] = get_basket_quantity(request)
+        context["basket_quantity"] = SimpleLazyObject(
+            lambda: get_basket_quantity(request)
+        )
         return context
 
 
@@ -421,10 +569,15 @@ class ShopSettings(BaseGenericSetting):
         blank=True,
         help_text=("Optional - reply to email address for shop notification emails."),
     )
+    hide_out_of_stock = models.BooleanField(
+        default=False,
+        help_text="Hide products with no live variants in stock from category pages.",
+    )
 
     panels = [
         FieldPanel("notify_email_addresses"),
         FieldPanel("reply_to"),
+        FieldPanel("hide_out_of_stock"),
     ]
 
 
@@ -522,6 +675,10 @@ class Sale(ClusterableModel):
                 name="start_before_end_constraint",
             )
         ]
+        indexes = [
+            # current_sale (sales that have started) and next_change
+            models.Index(fields=["start_date"], name="sale_start_date_idx"),
+        ]
 
     @classmethod
     def current_sale(cls):
@@ -534,6 +691,19 @@ class Sale(ClusterableModel):
             if sale.sale_categories.exists() or sale.sale_products.exists():
                 return sale
 
+    @classmethod
+    def next_change(cls):
+        """
+        The next time a sale starts or ends, or None if there are no upcoming sales
+        """
+        now = timezone.now()
+        changes = cls.objects.aggregate(
+            next_start=models.Min("start_date", filter=models.Q(start_date__gt=now)),
+            next_end=models.Min("end_date", filter=models.Q(end_date__gt=now)),
+        )
+        upcoming = [change for change in changes.values() if change is not None]
+        return min(upcoming) if upcoming else None
+
     def __str__(self):
         return f"{self.name} ({self.start_date.strftime('%d%b%y')} - {self.end_date.strftime('%d%b%y')})"
 
@@ -31,4 +31,11 @@ class SaleModifier(BasketModifier):
             item_discount = sale_item.discount
             label = f"Sale: {item_discount}% off"
             discount_amount = item.total / -item_discount
-            self.add_extra_row(item, request, label, discount_amount)
+            # the sale is recorded for sales reporting
+            self.add_extra_row(
+                item,
+                request,
+                label,
+                discount_amount,
+                extra={"sale_id": sale_item.sale_id},
+            )
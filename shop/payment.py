@@ -1,6 +1,10 @@
 # payment.py
+import asyncio
+from weakref import WeakKeyDictionary
+
 from django.conf import settings
 from django.shortcuts import render
+from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
@@ -28,6 +32,23 @@ PAYMENT_METHOD_BUTTON_TEXT = {
 }
 
 
+# Stripe clients for async requests, by event loop. httpx connection pools can't
+# be shared between event loops: under ASGI each worker has a single loop, but
+# under WSGI each async view runs in a loop of its own.
+_async_stripe_clients = WeakKeyDictionary()
+
+
+def async_stripe_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_stripe_clients:
+        _async_stripe_clients[loop] = stripe.StripeClient(
+            stripe.api_key,
+            base_addresses={"api": stripe.api_base},
+            http_client=stripe.HTTPXClient(),
+        )
+    return _async_stripe_clients[loop]
+
+
 class PayInAdvance(PaymentMethod):
     """
     Payment method that requires advance payment via bank account.
@@ -91,17 +112,24 @@ class PayByStripe(StripePayment):
         return render(request, "shop/stripe_cancel.html")
 
     @classmethod
-    def success_view(cls, request):
+    async def success_view(cls, request):
         """
         Handle successfull payment on Stripe.
+
+        Stripe's async requests (made with httpx) don't hold a worker thread
+        while waiting for Stripe under ASGI. The page is rendered lazily, in
+        a thread, as its context processors use the database.
         """
         checkout_session_id = request.GET.get("session_id")
-        session = stripe.checkout.Session.retrieve(checkout_session_id)
-        customer = stripe.Customer.retrieve(session.customer)
+        client = async_stripe_client()
+        session = await client.checkout.sessions.retrieve_async(checkout_session_id)
+        customer = await client.customers.retrieve_async(session.customer)
         context = {"email": customer.email, "total": session.amount_total / 100}
-        return render(request, "shop/stripe_success.html", context)
+        return TemplateResponse(request, "shop/stripe_success.html", context)
 
 
+# Fulfilling the order is database work, in a transaction, so the webhook stays
+# sync; under ASGI, Django runs it in a thread
 @csrf_exempt
 def stripe_webhook_view(request):
     return PayByStripe.webhook_view(request)
@@ -0,0 +1,77 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+
+
+logger = logging.getLogger(__name__)
+
+
+# Renditions used for product images; these are generated ahead of time so that
+# storefront requests only ever look up existing renditions. Specs can use
+# wagtail's brace expansion, as for the {% picture %} tag.
+PRODUCT_IMAGE_FILTERS = {
+    "card": "fill-{180x180,360x360}-c100|format-{avif,webp,jpeg}",
+    "detail": "fill-{300x300,450x450,600x600}-c100|format-{avif,webp,jpeg}",
+    "zoom": "max-1200x1200",  # linked from the product detail page
+    "thumbnail": "max-165x165",  # wagtail admin listings and choosers
+}
+# Rendered sizes of the <picture> images, for the browser to choose a width
+PRODUCT_IMAGE_SIZES = {
+    "card": "180px",
+    "detail": "300px",
+}
+
+
+def product_image_filter_specs(size=None):
+    sizes = [size] if size else PRODUCT_IMAGE_FILTERS
+    return [
+        spec
+        for size in sizes
+        for spec in Filter.expand_spec(PRODUCT_IMAGE_FILTERS[size])
+    ]
+
+
+def generate_renditions(image_ids):
+    """
+    Generate any missing product renditions for the given images. Returns the
+    number of images processed.
+    """
+    filter_specs = product_image_filter_specs()
+    count = 0
+    for image in get_image_model().objects.filter(id__in=image_ids):
+        try:
+            image.get_renditions(*filter_specs)
+        except Exception:
+            # A missing or broken source file shouldn't stop the other images
+            logger.exception("Could not generate renditions for image %s", image.id)
+        else:
+            count += 1
+    return count
+
+
+# A single background thread, so rendition generation never runs inside a
+# request and uploads don't compete with each other
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="renditions")
+
+
+def _generate_renditions_in_background(image_ids):
+    try:
+        generate_renditions(image_ids)
+    finally:
+        # the worker thread has its own database connection
+        connection.close()
+
+
+def schedule_renditions(*image_ids):
+    """
+    Generate renditions for the images in the background, once the current
+    transaction has committed (so the worker can see the saved images)
+    """
+    image_ids = [image_id for image_id in image_ids if image_id]
+    if image_ids:
+        transaction.on_commit(
+            lambda: _executor.submit(_generate_renditions_in_background, image_ids)
+        )
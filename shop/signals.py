@@ -1,14 +1,34 @@
 # signals.py
 from django.conf import settings
 from django.core.mail import EmailMessage
-from django.db.models.signals import post_delete, post_init, post_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 
 from salesman.core.utils import get_salesman_model
 from salesman.orders.signals import status_changed
+from wagtail.signals import page_published, page_unpublished, post_page_move
 
-from .models import ShopSettings, ProductVariant
+from home.page_cache import clear_page_cache
+
+from .breadcrumbs import cache_shop_breadcrumbs, clear_shop_breadcrumbs
+from .models import (
+    STOCK_COUNTERS,
+    Product,
+    ProductVariant,
+    Sale,
+    SaleCategory,
+    SaleProduct,
+    ShopSettings,
+    update_inherited_prices,
+)
+from .renditions import schedule_renditions
+from .stock import (
+    recount_product_stock,
+    stock_counters,
+    take_ordered_stock,
+    update_stock,
+)
 
 
 BasketItem = get_salesman_model("BasketItem")
@@ -116,34 +136,156 @@ def post_save_item(sender, instance, **kwargs):
     if instance.product:
         quantity_diff = instance._current_quantity - instance.quantity
         # positive diff means items have been taken out of basket, so add to stock
-        instance.product.stock += quantity_diff
+        update_stock(instance.product, quantity_diff)
         instance.product.save()
 
 
 @receiver(post_delete, sender=BasketItem)
 def post_delete_basket_item(sender, instance, **kwargs):
     if instance.product:
-        instance.product.stock += instance.quantity
+        update_stock(instance.product, instance.quantity)
         instance.product.save()
 
 
 @receiver(post_delete, sender=Basket)
 def post_delete_item(sender, instance, **kwargs):
     if "basket_id" in instance.extra:
-        matching_order = Order.objects.filter(
-            _extra__basket_id=instance.extra["basket_id"]
-        )
-        if matching_order.exists():
-            order = matching_order.first()
-            # basket deleted post-order creation, items from basket have been replaced
-            # in stock, so we need to update the stock based on the order items
-            for item in order.get_items():
-                item.product.stock -= item.quantity
-                item.product.save()
+        # basket deleted post-order creation, items from basket have been replaced
+        # in stock, so we need to update the stock based on the order items
+        if take_ordered_stock(instance.extra["basket_id"]):
+            # the variants were updated without being saved
+            clear_page_cache()
 
 
-@receiver(post_save, sender=ProductVariant)
+@receiver(pre_save, sender=ProductVariant)
 def update_price(sender, instance, **kwargs):
+    # Resolve the price before it's written, so a variant is saved only once
     if instance.price is None or instance.price == "":
+        instance.inherit_price = True
+    elif instance.price != instance._current_price:
+        # a price entered by the editor, which the variant keeps; an inherited
+        # price left as it was loaded follows the product's price
+        instance.inherit_price = False
+    if instance.inherit_price:
         instance.price = instance.product.price
-        instance.save()
+    instance._current_price = instance.price
+
+
+@receiver(post_init, sender=ProductVariant)
+def post_init_variant(sender, instance, **kwargs):
+    # Remember the variant's current share of its product's stock counters;
+    # None if the variant was loaded without its stock
+    if instance.pk is None:
+        instance._current_counters = {}
+    elif {"stock", "live"} <= instance.__dict__.keys():
+        instance._current_counters = stock_counters(instance)
+    else:
+        instance._current_counters = None
+    instance._current_product_id = instance.__dict__.get("product_id")
+    instance._current_price = instance.__dict__.get("price")
+    instance._current_image_id = instance.__dict__.get("image_id")
+    instance._displayed_state = _displayed_state(instance)
+
+
+def _displayed_state(variant):
+    # What cached pages show of a variant: its fields, except that of its stock
+    # they only show whether it is in stock; the stock counts are loaded per
+    # visitor (see shop.views.variant_stock). Deferred fields are None.
+    state = {
+        field.attname: variant.__dict__.get(field.attname)
+        for field in ProductVariant._meta.concrete_fields
+        if field.attname not in ("stock", "low_stock_alert_pending")
+    }
+    stock = variant.__dict__.get("stock")
+    state["in_stock"] = None if stock is None else stock > 0
+    return state
+
+
+def _cached_product(variant):
+    field = ProductVariant._meta.get_field("product")
+    return variant.product if field.is_cached(variant) else None
+
+
+def _recount_stock(product_ids, variant):
+    # Recounted from the variants in the database, rather than by applying the
+    # change in this variant's counters: basket changes save the stock they
+    # read earlier, so two of them can save the same change
+    recount_product_stock(product_ids)
+    product = _cached_product(variant)
+    if product is not None:
+        product.refresh_from_db(fields=STOCK_COUNTERS)
+
+
+@receiver(post_save, sender=ProductVariant)
+def update_product_stock_counters(sender, instance, **kwargs):
+    counters = stock_counters(instance)
+    moved = instance._current_product_id not in (None, instance.product_id)
+    if moved or counters != instance._current_counters:
+        _recount_stock(
+            {instance.product_id, instance._current_product_id} - {None}, instance
+        )
+    instance._current_counters = counters
+    instance._current_product_id = instance.product_id
+
+
+@receiver(post_delete, sender=ProductVariant)
+def remove_product_stock_counters(sender, instance, **kwargs):
+    _recount_stock([instance.product_id], instance)
+
+
+@receiver(post_init, sender=Product)
+def post_init_product(sender, instance, **kwargs):
+    # Remember current price and image on the instance
+    instance._current_price = instance.price
+    instance._current_image_id = instance.__dict__.get("image_id")
+
+
+@receiver(post_save, sender=Product)
+def update_variant_prices(sender, instance, created, **kwargs):
+    if not created and instance.price != instance._current_price:
+        update_inherited_prices([instance])
+    instance._current_price = instance.price
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+def generate_product_renditions(sender, instance, created, **kwargs):
+    # Only a new image needs renditions; stock and price saves don't
+    if created or instance.image_id != instance._current_image_id:
+        schedule_renditions(instance.image_id)
+    instance._current_image_id = instance.image_id
+
+
+@receiver(page_published)
+@receiver(post_page_move)
+def update_shop_breadcrumbs(sender, **kwargs):
+    cache_shop_breadcrumbs()
+
+
+@receiver(page_unpublished)
+def clear_shop_breadcrumbs_on_unpublish(sender, **kwargs):
+    clear_shop_breadcrumbs()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=SaleCategory)
+@receiver(post_delete, sender=SaleCategory)
+@receiver(post_save, sender=SaleProduct)
+@receiver(post_delete, sender=SaleProduct)
+def clear_cached_shop_pages(sender, **kwargs):
+    # Cached shop pages show products, stock and sale prices
+    clear_page_cache()
+
+
+@receiver(post_save, sender=ProductVariant)
+def clear_cached_shop_pages_on_variant_change(sender, instance, created, **kwargs):
+    # Every basket change saves its variant's stock; the cached pages are kept
+    # unless the variant changes in a way they show
+    state = _displayed_state(instance)
+    if created or state != instance._displayed_state:
+        clear_page_cache()
+    instance._displayed_state = state
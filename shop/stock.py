@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+
+from .models import OrderItem, Product, ProductVariant
+
+
+def is_low_stock(stock):
+    return stock <= settings.LOW_STOCK_THRESHOLD
+
+
+def update_stock(variant, quantity_diff):
+    """
+    Adjust a variant's stock (not saved). If this takes it down to the low stock
+    threshold, flag it for the next low stock digest; the flag is saved with the
+    stock change, so alerts add no work to basket updates.
+    """
+    previous_stock = variant.stock
+    variant.stock += quantity_diff
+    if is_low_stock(variant.stock) and not is_low_stock(previous_stock):
+        variant.low_stock_alert_pending = True
+
+
+def low_stock_variants():
+    # Uses the (live, stock) index
+    return (
+        ProductVariant.objects.filter(
+            live=True, stock__lte=settings.LOW_STOCK_THRESHOLD
+        )
+        .select_related("product")
+        .order_by("stock", "id")
+    )
+
+
+def stock_counters(variant):
+    """A variant's share of its product's stock counters"""
+    return {
+        "total_stock": variant.stock if variant.live else 0,
+        "live_variant_count": int(variant.live),
+        "in_stock_variant_count": int(variant.live and variant.stock > 0),
+    }
+
+
+def take_ordered_stock(basket_id):
+    """
+    Take the quantities ordered from a basket out of stock again, in a single
+    UPDATE of the ordered variants, flagging low stock as update_stock does.
+    The variants' products are then recounted. Returns the number of variants
+    updated.
+    """
+    ordered_items = OrderItem.objects.filter(order__basket_id=basket_id)
+    ordered = Subquery(
+        ordered_items.filter(product_id=OuterRef("pk"))
+        .order_by()
+        .values("product_id")
+        .annotate(quantity=Sum("quantity"))
+        .values("quantity")
+    )
+    variants = ProductVariant.objects.filter(pk__in=ordered_items.values("product_id"))
+    threshold = settings.LOW_STOCK_THRESHOLD
+    updated = variants.update(
+        stock=F("stock") - ordered,
+        # both conditions use the stock before the update
+        low_stock_alert_pending=Case(
+            When(stock__gt=threshold, stock__lte=ordered + threshold, then=True),
+            default=F("low_stock_alert_pending"),
+        ),
+    )
+    if updated:
+        recount_product_stock(variants.values("product_id"))
+    return updated
+
+
+def recount_product_stock(products):
+    """
+    Recalculate the stock counters for products (instances, ids or a queryset)
+    from their variants, in a single UPDATE
+    """
+    live_variants = (
+        ProductVariant.objects.filter(product=OuterRef("pk"), live=True)
+        .order_by()
+        .values("product")
+    )
+    return Product.objects.filter(pk__in=products).update(
+        total_stock=Coalesce(
+            Subquery(live_variants.annotate(total=Sum("stock")).values("total")), 0
+        ),
+        live_variant_count=Coalesce(
+            Subquery(live_variants.annotate(count=Count("pk")).values("count")), 0
+        ),
+        in_stock_variant_count=Coalesce(
+            Subquery(
+                live_variants.filter(stock__gt=0)
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        ),
+    )
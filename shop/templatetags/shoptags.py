@@ -1,9 +1,16 @@
 import re
 
 from django import template
-from wagtail.models import Page
 
-from shop.models import ShopPage, CategoryPage
+from wagtail.images.models import Picture
+from wagtail.images.shortcuts import (
+    get_rendition_or_not_found,
+    get_renditions_or_not_found,
+)
+
+from home.breadcrumbs import get_breadcrumbs
+from shop.breadcrumbs import get_category_breadcrumbs, get_shop_breadcrumbs
+from shop.renditions import PRODUCT_IMAGE_SIZES, product_image_filter_specs
 
 
 register = template.Library()
@@ -29,17 +36,15 @@ def shop_breadcrumbs(context):
         # When on the home page, displaying breadcrumbs is irrelevant.
         # skip this for products so we can add in the category
         ancestors = ()
+    elif current_page == "product":
+        # Breadcrumbs are cached, so they render without queries
+        ancestors = get_category_breadcrumbs(context["product"].category_page_id)
+        this_page = context["product"].name
+    elif current_page in path_to_current_page:
+        ancestors = get_shop_breadcrumbs()
+        this_page = path_to_current_page[current_page]
     else:
-        # is it a product or other shop page
-        if current_page in path_to_current_page or current_page == "product":
-            self = ShopPage.objects.latest("id")
-            this_page = path_to_current_page.get(current_page, context["product"].name)
-
-        ancestors = list(
-            Page.objects.ancestor_of(self, inclusive=True).filter(depth__gt=1)
-        )
-        if current_page == "product":
-            ancestors.append(context["product"].category_page)
+        ancestors = get_breadcrumbs(self)
 
     context_data = {
         "ancestors": ancestors,
@@ -48,3 +53,22 @@ def shop_breadcrumbs(context):
     }
 
     return context_data
+
+
+@register.simple_tag
+def product_picture(image, size, **attrs):
+    """
+    Render a product image as a <picture>, with a source per format and a srcset
+    across the widths of the pre-generated renditions for the size ("card" or
+    "detail")
+    """
+    renditions = get_renditions_or_not_found(image, product_image_filter_specs(size))
+    attrs = {"sizes": PRODUCT_IMAGE_SIZES[size], **attrs}
+    return Picture(renditions, attrs).__html__()
+
+
+@register.simple_tag
+def product_image_url(image, size):
+    # url of a single pre-generated rendition, e.g. to link to a larger image
+    [spec] = product_image_filter_specs(size)
+    return get_rendition_or_not_found(image, spec).url
@@ -0,0 +1,288 @@
+import csv
+import json
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from model_bakery import baker
+
+from ..catalogue import CatalogueImport
+from ..models import Product, ProductVariant
+
+
+pytestmark = pytest.mark.django_db
+
+
+def write_csv(tmp_path, rows, name="catalogue.csv"):
+    path = tmp_path / name
+    with path.open("w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def write_json(tmp_path, rows, name="catalogue.json"):
+    path = tmp_path / name
+    path.write_text(json.dumps(rows))
+    return path
+
+
+def test_import_creates_products_and_variants(
+    capsys, tmp_path, category_page, django_capture_on_commit_callbacks
+):
+    path = write_csv(
+        tmp_path,
+        [
+            {
+                "category": "Test Category",
+                "product": "Mug",
+                "product_price": "8.50",
+                "variant": "",
+                "colour": "Blue",
+                "size": "",
+                "price": "",
+                "stock": "4",
+                "live": "yes",
+            },
+            {
+                "category": "test category",
+                "product": "Mug",
+                "product_price": "8.50",
+                "variant": "",
+                "colour": "Red",
+                "size": "",
+                "price": "9",
+                "stock": "0",
+                "live": "no",
+            },
+        ],
+    )
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        call_command("import_catalogue", str(path))
+    # page cache cleared after the import
+    assert len(callbacks) == 1
+    assert (
+        capsys.readouterr().out.strip()
+        == "Products: 1 created, 0 updated. Variants: 2 created, 0 updated."
+    )
+
+    product = Product.objects.get(name="Mug")
+    assert product.category_page == category_page
+    assert product.price == Decimal("8.50")
+    blue, red = product.variants.order_by("sort_order")
+    assert (blue.colour, blue.size, blue.variant_name) == ("Blue", None, None)
+    # no variant price, so the product price is used
+    assert blue.price == Decimal("8.50")
+    assert (blue.stock, blue.live) == (4, True)
+    assert (red.price, red.stock, red.live) == (Decimal("9"), 0, False)
+
+
+def test_import_updates_existing_products_and_variants(capsys, tmp_path, product):
+    small = baker.make(
+        ProductVariant, product=product, variant_name="Small", stock=1, price=12
+    )
+    large = baker.make(
+        ProductVariant,
+        product=product,
+        variant_name="Large",
+        stock=1,
+        price=15,
+        sort_order=3,
+    )
+    path = write_json(
+        tmp_path,
+        [
+            {
+                "category": product.category_page.slug,
+                "product": "Test Product",
+                "variant": "Small",
+                "stock": 10,
+            },
+            {
+                "category": "Test Category",
+                "product": "Test Product",
+                "variant": "Large",
+                "stock": 1,
+                "live": False,
+            },
+            {
+                "category": "Test Category",
+                "product": "Test Product",
+                "product_price": "20",
+                "variant": "Extra large",
+                "price": None,
+            },
+        ],
+    )
+    call_command("import_catalogue", str(path))
+    assert (
+        capsys.readouterr().out.strip()
+        == "Products: 0 created, 1 updated. Variants: 1 created, 2 updated."
+    )
+    product.refresh_from_db()
+    assert product.price == 20
+    small.refresh_from_db()
+    # unchanged columns are kept
+    assert (small.stock, small.price, small.live) == (10, 12, True)
+    large.refresh_from_db()
+    assert (large.stock, large.live) == (1, False)
+    extra_large = product.variants.get(variant_name="Extra large")
+    assert extra_large.price == 20
+    assert extra_large.sort_order == 4
+
+
+def test_import_dry_run(capsys, tmp_path, product):
+    variant = baker.make(
+        ProductVariant, product=product, variant_name="Small", stock=1, price=12
+    )
+    path = write_json(
+        tmp_path,
+        [
+            {
+                "category": "Test Category",
+                "product": "Test Product",
+                "variant": "Small",
+                "stock": 5,
+                "price": "12.00",
+            },
+            {"category": "Test Category", "product": "Test Product", "stock": 5},
+            {
+                "category": "Test Category",
+                "product": "Pen",
+                "variant": "Pack of 5",
+                "stock": 5,
+            },
+        ],
+    )
+    call_command("import_catalogue", str(path), dry_run=True)
+    assert capsys.readouterr().out.splitlines() == [
+        "~ Variant Test Product - Small: stock 1 -> 5",
+        "+ Variant Test Product",
+        "+ Product Pen",
+        "+ Variant Pen - Pack of 5",
+        "Dry run, no changes saved. "
+        "Products: 1 created, 0 updated. Variants: 2 created, 1 updated.",
+    ]
+    variant.refresh_from_db()
+    assert variant.stock == 1
+    assert not Product.objects.filter(name="Pen").exists()
+
+
+def test_import_errors(tmp_path, category_page):
+    path = write_json(
+        tmp_path,
+        [
+            {"category": "Unknown", "product": "Mug"},
+            {"category": "Test Category", "product": ""},
+            {"category": "Test Category", "product": "Mug", "price": "£1"},
+            {"category": "Test Category", "product": "Mug", "stock": "1.5"},
+            {"category": "Test Category", "product": "Mug", "live": "maybe"},
+            {"category": "Test Category", "product": "Mug", "sku": "1"},
+            {"category": "Test Category", "product": "Mug", "stock": "1"},
+        ],
+    )
+    with pytest.raises(CommandError) as error:
+        call_command("import_catalogue", str(path))
+    assert str(error.value).splitlines() == [
+        "No changes saved; the catalogue has errors:",
+        "Row 1: Unknown category 'Unknown'",
+        "Row 2: Product name is required",
+        "Row 3: '£1' is not a valid price",
+        "Row 4: '1.5' is not a whole number",
+        "Row 5: 'maybe' is not true or false",
+        "Row 6: Unknown columns sku",
+    ]
+    assert not Product.objects.exists()
+
+
+def test_import_unknown_format(tmp_path):
+    path = tmp_path / "catalogue.xml"
+    path.write_text("")
+    with pytest.raises(CommandError, match="Unknown catalogue format 'xml'"):
+        call_command("import_catalogue", str(path))
+
+
+def test_import_missing_file(tmp_path):
+    with pytest.raises(CommandError, match="No such file"):
+        call_command("import_catalogue", str(tmp_path / "missing.csv"))
+
+
+def test_import_integrity_error(tmp_path, product):
+    # variant name, colour and size are unique across all products
+    baker.make(
+        ProductVariant, product=product, variant_name="Tee", colour="Red", size="S"
+    )
+    path = write_csv(
+        tmp_path,
+        [
+            {
+                "category": "Test Category",
+                "product": "Shirt",
+                "variant": "Tee",
+                "colour": "Red",
+                "size": "S",
+            }
+        ],
+    )
+    with pytest.raises(CommandError, match="No changes saved"):
+        call_command("import_catalogue", str(path), format="csv")
+    assert not Product.objects.filter(name="Shirt").exists()
+
+
+def test_import_queries_do_not_depend_on_number_of_rows(
+    tmp_path, category_page, django_assert_num_queries
+):
+    def rows(products, variants, stock):
+        return [
+            {
+                "category": "Test Category",
+                "product": f"Product {product}",
+                "variant": f"Variant {variant}",
+                "stock": stock,
+                "price": "",
+            }
+            for product in range(products)
+            for variant in range(variants)
+        ]
+
+    catalogue_import = CatalogueImport()
+    catalogue_import.add_rows(rows(2, 2, stock=1))
+    # savepoint, product insert, variant insert, stock recount, release savepoint
+    with django_assert_num_queries(5):
+        catalogue_import.save()
+
+    # 4 existing variants updated, 40 products and 416 variants created; all
+    # the lookups use the existing data loaded up front
+    with django_assert_num_queries(3):
+        catalogue_import = CatalogueImport()
+        catalogue_import.add_rows(rows(42, 10, stock=2))
+    with django_assert_num_queries(6):
+        catalogue_import.save()
+    assert ProductVariant.objects.count() == 420
+    product = Product.objects.get(name="Product 0")
+    assert (product.total_stock, product.in_stock_variant_count) == (20, 10)
+
+
+def test_import_product_price_change_updates_inheriting_variants(tmp_path, product):
+    inheriting = baker.make(ProductVariant, product=product, price=None)
+    priced = baker.make(ProductVariant, product=product, variant_name="L", price=15)
+    path = write_json(
+        tmp_path,
+        [
+            {
+                "category": "Test Category",
+                "product": "Test Product",
+                "product_price": "14",
+                "variant": "L",
+                "price": "",
+            },
+        ],
+    )
+    call_command("import_catalogue", str(path))
+    inheriting.refresh_from_db()
+    assert inheriting.price == 14
+    # a blank price in the catalogue sets the variant to use the product price
+    priced.refresh_from_db()
+    assert (priced.price, priced.inherit_price) == (14, True)
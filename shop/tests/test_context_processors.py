@@ -0,0 +1,38 @@
+import pytest
+from django.template.loader import render_to_string
+
+from ..context_processors import shop_context
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_shop_context_is_lazy(rf, django_assert_num_queries):
+    request = rf.get("/")
+    with django_assert_num_queries(0):
+        context = shop_context(request)
+    # values are only looked up when they are used
+    assert context["basket_quantity"] == 0
+    assert not context["current_sale"]
+
+
+def test_shop_context_current_sale(rf, freezer, sale_with_items):
+    freezer.move_to("2022-01-01 09:00")
+    context = shop_context(rf.get("/"))
+    assert context["current_sale"].name == "Test Sale"
+
+
+def test_partial_render_does_not_evaluate_shop_context(
+    rf, basket, django_assert_num_queries
+):
+    request = rf.post("/")
+    request.session = {"BASKET_ID": basket.id}
+    with django_assert_num_queries(0):
+        html = render_to_string(
+            "shop/includes/quantity_field.html",
+            {"product_id": 1, "value": 2},
+            request,
+        )
+    assert "value=2" in html
+    # the basket lookup didn't run, so the request is untouched
+    assert request.method == "POST"
@@ -4,18 +4,24 @@ import pytest
 from model_bakery import baker
 
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import RequestFactory
 from django.utils import timezone
 from django.urls import reverse
 
 from salesman.core.utils import get_salesman_model
 
+from django.template import Context, Template
+from wagtail_factories import ImageFactory
+
 from .factories import CategoryPageFactory
-from ..models import Sale, SaleCategory, SaleProduct
+from ..models import Product, Sale, SaleCategory, SaleProduct, prefetch_product_images
+from ..renditions import generate_renditions, product_image_filter_specs
 
 pytestmark = pytest.mark.django_db
 
 Basket = get_salesman_model("Basket")
+Order = get_salesman_model("Order")
 
 
 def test_category(category_page):
@@ -205,6 +211,39 @@ def test_product_images(product):
     assert len(product.images) == 2
 
 
+def test_prefetch_product_images(
+    settings, tmp_path, category_page, django_assert_num_queries
+):
+    settings.MEDIA_ROOT = tmp_path
+    products = baker.make("shop.Product", category_page=category_page, _quantity=3)
+    for product in products:
+        product.image = ImageFactory()
+        product.save()
+        baker.make("shop.ProductVariant", product=product, image=product.image)
+        baker.make("shop.ProductVariant", product=product, image=ImageFactory())
+        baker.make("shop.ProductVariant", product=product, image=None)
+        generate_renditions([image.id for image in product.images])
+
+    card_specs = product_image_filter_specs("card")
+    # products, variants, images and renditions
+    with django_assert_num_queries(4):
+        prefetched = prefetch_product_images(
+            Product.objects.filter(id__in=[product.id for product in products]),
+            "card",
+        )
+    template = Template(
+        "{% load shoptags %}"
+        "{% for image in product.images %}{% product_picture image 'card' %}{% endfor %}"
+    )
+    with django_assert_num_queries(0):
+        for product in prefetched:
+            html = template.render(Context({"product": product}))
+            assert html.count("<picture>") == 2
+            # only the renditions of the size asked for
+            for image in product.images:
+                assert len(image.prefetched_renditions) == len(card_specs)
+
+
 def test_basket_item(product):
     basket_item = baker.make("shop.BasketItem")
     assert basket_item.name == "(no name)"
@@ -351,3 +390,53 @@ def test_get_sale_item_for_product_variant(freezer, sale_with_items):
     assert p_variant.get_sale_item().discount == 20
     assert p_inheriting_variant.get_sale_item().discount == 10
     assert p_excluded.get_sale_item() is None
+
+
+def explain(queryset, index):
+    # The test tables are tiny, and their statistics depend on what other tests
+    # left in the database, so which index the planner picks is arbitrary.
+    # Sequential scans and the table's other indexes are turned off (for this
+    # test's transaction) to check that the planner can use the index at all.
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        constraints = connection.introspection.get_constraints(cursor, table)
+        for name, constraint in constraints.items():
+            if constraint["index"] and not constraint["unique"] and index not in name:
+                cursor.execute(f'DROP INDEX "{name}"')
+    return queryset.explain()
+
+
+@pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="checks PostgreSQL query plans"
+)
+@pytest.mark.parametrize(
+    "get_queryset,index",
+    [
+        (
+            lambda product: Basket.objects.filter(timeout__lt=timezone.now()),
+            "basket_timeout_idx",
+        ),
+        (
+            lambda product: Sale.objects.filter(
+                start_date__lte=timezone.now(), end_date__gt=timezone.now()
+            ),
+            "sale_start_date_idx",
+        ),
+        (
+            lambda product: Sale.objects.filter(start_date__gt=timezone.now()),
+            "sale_start_date_idx",
+        ),
+        (
+            lambda product: product.category_page.live_products,
+            "product_category_live_idx",
+        ),
+        (lambda product: product.live_variants, "variant_product_live_idx"),
+        (
+            lambda product: Order.objects.filter(basket_id=1),
+            "shop_order_basket_id",
+        ),
+    ],
+)
+def test_hot_filters_use_indexes(product, get_queryset, index):
+    assert index in explain(get_queryset(product), index)
@@ -37,5 +37,5 @@ def test_sale_modifier(freezer, sale_with_items, basket):
     assert basket_item.extra_rows["sales-discount"].data == {
         "label": "Sale: 20% off",
         "amount": "-1.00",
-        "extra": {},
+        "extra": {"sale_id": sale_with_items.id},
     }
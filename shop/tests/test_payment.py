@@ -1,4 +1,5 @@
 from datetime import datetime
+from unittest.mock import AsyncMock, Mock, patch
 from urllib.parse import urlparse, parse_qs
 
 import pytest
@@ -56,18 +57,6 @@ def mock_stripe(requests_mock):
         "https://api.stripe.com/v1/checkout/sessions",
         json={"url": "https://stripe-session-url"},
     )
-    # These are used for getting stripe session data
-    requests_mock.get(
-        "https://api.stripe.com/v1/checkout/sessions/test-session",
-        json={
-            "customer": "customer-id-1",
-            "amount_total": 2000,
-        },
-    )
-    requests_mock.get(
-        "https://api.stripe.com/v1/customers/customer-id-1",
-        json={"email": "test@test.com"},
-    )
 
 
 def test_pay_by_stripe(mock_stripe, rf, basket):
@@ -119,9 +108,21 @@ def test_cancel_view(rf):
     assert "Your payment was cancelled" in resp.content.decode()
 
 
-def test_success_view(rf, mock_stripe):
-    request = rf.get("/?session_id=test-session")
-    resp = PayByStripe.success_view(request)
+@patch("shop.payment.stripe.StripeClient")
+def test_success_view(mock_stripe_client, client):
+    stripe_client = mock_stripe_client.return_value
+    stripe_client.checkout.sessions.retrieve_async = AsyncMock(
+        return_value=Mock(customer="customer-id-1", amount_total=2000)
+    )
+    stripe_client.customers.retrieve_async = AsyncMock(
+        return_value=Mock(email="test@test.com")
+    )
+    resp = client.get(reverse("stripe-success"), {"session_id": "test-session"})
+    # the async view is run by the sync handler too
+    stripe_client.checkout.sessions.retrieve_async.assert_awaited_once_with(
+        "test-session"
+    )
+    stripe_client.customers.retrieve_async.assert_awaited_once_with("customer-id-1")
     content = resp.content.decode()
     assert "You have been charged £20.00" in content
     assert "Your order confirmation has been emailed to test@test.com" in content
@@ -303,9 +304,6 @@ def test_success_view(rf, mock_stripe):
 # }
 
 
-from unittest.mock import Mock, patch
-
-
 @pytest.fixture
 def get_mock_stripe_session():
     def stripe_session(**params):
@@ -0,0 +1,146 @@
+from unittest.mock import Mock
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+from wagtail.images.models import Rendition
+from wagtail_factories import ImageFactory
+
+from .. import renditions
+from ..management.commands import generate_renditions as generate_renditions_command
+from ..renditions import generate_renditions, product_image_filter_specs
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.fixture
+def sync_executor(monkeypatch):
+    # run the background work immediately
+    class Executor:
+        def submit(self, fn, *args):
+            fn(*args)
+
+    monkeypatch.setattr(renditions, "_executor", Executor())
+    # the worker thread closes its connection; don't close the test's connection
+    monkeypatch.setattr(renditions, "connection", Mock())
+
+
+def test_product_image_filter_specs():
+    specs = product_image_filter_specs()
+    assert "fill-360x360-c100|format-avif" in specs
+    assert "max-165x165" in specs
+    assert len(specs) == len(set(specs)) == 17
+    assert product_image_filter_specs("card") == [
+        "fill-180x180-c100|format-avif",
+        "fill-180x180-c100|format-webp",
+        "fill-180x180-c100|format-jpeg",
+        "fill-360x360-c100|format-avif",
+        "fill-360x360-c100|format-webp",
+        "fill-360x360-c100|format-jpeg",
+    ]
+
+
+def test_generate_renditions():
+    image = ImageFactory()
+    assert generate_renditions([image.id]) == 1
+    assert set(
+        Rendition.objects.filter(image=image).values_list("filter_spec", flat=True)
+    ) == set(product_image_filter_specs())
+    # existing renditions are not regenerated
+    assert generate_renditions([image.id]) == 1
+    assert Rendition.objects.filter(image=image).count() == 17
+
+
+def test_generate_renditions_missing_file():
+    image = ImageFactory()
+    image.file.delete(save=False)
+    assert generate_renditions([image.id]) == 0
+    assert not Rendition.objects.filter(image=image).exists()
+
+
+def test_renditions_generated_on_commit_when_product_image_set(
+    product, sync_executor, django_capture_on_commit_callbacks
+):
+    image = ImageFactory()
+    with django_capture_on_commit_callbacks(execute=True):
+        product.save()
+    assert not Rendition.objects.exists()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.image = image
+        product.save()
+    assert Rendition.objects.filter(image=image).count() == 17
+
+
+def test_renditions_generated_when_variant_image_set(
+    product, sync_executor, django_capture_on_commit_callbacks
+):
+    image = ImageFactory()
+    with django_capture_on_commit_callbacks(execute=True):
+        baker.make("shop.ProductVariant", product=product, image=image)
+    assert Rendition.objects.filter(image=image).count() == 17
+
+
+def test_renditions_scheduled_only_for_new_images(product, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(
+        "shop.signals.schedule_renditions", lambda image_id: scheduled.append(image_id)
+    )
+    image = ImageFactory()
+    variant = baker.make("shop.ProductVariant", product=product, image=image, stock=3)
+    assert scheduled == [image.id]
+
+    # stock and price changes keep the image
+    variant.stock = 2
+    variant.save()
+    product.price = 15
+    product.save()
+    assert scheduled == [image.id]
+
+    product.image = image
+    product.save()
+    assert scheduled == [image.id, image.id]
+
+
+@pytest.fixture
+def in_process_pool(monkeypatch):
+    # worker processes can't see data in the test transaction, so run the
+    # workers' tasks in this process
+    class Pool:
+        def __init__(self, processes, initializer):
+            initializer()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def imap_unordered(self, fn, iterable):
+            return map(fn, iterable)
+
+    class Context:
+        def Pool(self, *args, **kwargs):
+            return Pool(*args, **kwargs)
+
+    monkeypatch.setattr(
+        generate_renditions_command, "get_context", lambda method: Context()
+    )
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_generate_renditions_command(capsys, product, in_process_pool, processes):
+    images = ImageFactory.create_batch(3)
+    product.image = images[0]
+    product.save()
+    for image in images:
+        baker.make("shop.ProductVariant", product=product, image=image)
+    call_command("generate_renditions", processes=processes, chunk_size=2)
+    assert Rendition.objects.count() == 51
+    assert "Generated renditions for 3 of 3 product images" in capsys.readouterr().out
@@ -2,9 +2,13 @@ import pytest
 from model_bakery import baker
 
 from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from salesman.core.utils import get_salesman_model
 
+from ..models import Product, ProductVariant
+
 
 Order = get_salesman_model("Order")
 
@@ -32,11 +36,106 @@ def checkout_basket(basket, payment_method):
     return basket
 
 
+def writes(queries, table):
+    return [
+        query["sql"]
+        for query in queries
+        if query["sql"].startswith((f'INSERT INTO "{table}"', f'UPDATE "{table}"'))
+    ]
+
+
 def test_product_variant_price_set_from_product(product):
     variant = baker.make(
         "shop.ProductVariant", product=product, variant_name="Small", price=None
     )
     assert variant.price == 12
+    assert variant.inherit_price
+
+
+def test_product_variant_price_set_from_product_in_single_write(product):
+    with CaptureQueriesContext(connection) as queries:
+        variant = baker.make(
+            "shop.ProductVariant", product=product, variant_name="Small", price=None
+        )
+    assert len(writes(queries, "shop_productvariant")) == 1
+    variant.refresh_from_db()
+    assert variant.price == 12
+
+
+def test_product_variant_inherit_price_overrides_price(product):
+    variant = baker.make(
+        "shop.ProductVariant", product=product, price=20, inherit_price=True
+    )
+    assert variant.price == 12
+    variant.inherit_price = False
+    variant.price = 20
+    variant.save()
+    variant.refresh_from_db()
+    assert variant.price == 20
+
+
+def test_product_variant_entered_price_stops_inheriting(product):
+    variant = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Small", price=None
+    )
+    variant = ProductVariant.objects.get(id=variant.id)
+    # the editor types a price, leaving "Use product price" checked
+    variant.price = 20
+    variant.save()
+    variant.refresh_from_db()
+    assert (variant.price, variant.inherit_price) == (20, False)
+
+
+def test_product_variant_loaded_price_keeps_inheriting(product):
+    variant = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Small", price=None
+    )
+    variant = ProductVariant.objects.get(id=variant.id)
+    # the product's price changes while the variant is being edited
+    product.price = 14
+    product.save()
+    variant.stock = 2
+    variant.save()
+    variant.refresh_from_db()
+    assert (variant.price, variant.inherit_price) == (14, True)
+
+
+def test_product_price_change_updates_inheriting_variants(product):
+    inheriting = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Small", price=None
+    )
+    priced = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Large", price=15
+    )
+    other_product = baker.make(
+        "shop.Product", category_page=product.category_page, price=12
+    )
+    other_inheriting = baker.make(
+        "shop.ProductVariant", product=other_product, price=None
+    )
+
+    product.price = 14
+    with CaptureQueriesContext(connection) as queries:
+        product.save()
+    # one update for the product, and one for all its inheriting variants
+    assert len(writes(queries, "shop_product")) == 1
+    assert len(writes(queries, "shop_productvariant")) == 1
+
+    inheriting.refresh_from_db()
+    assert inheriting.price == 14
+    priced.refresh_from_db()
+    assert priced.price == 15
+    other_inheriting.refresh_from_db()
+    assert other_inheriting.price == 12
+
+
+def test_product_save_without_price_change_does_not_update_variants(product):
+    baker.make("shop.ProductVariant", product=product, price=None)
+    product = Product.objects.get(id=product.id)
+    product.name = "Renamed"
+    with CaptureQueriesContext(connection) as queries:
+        product.save()
+    assert len(writes(queries, "shop_productvariant")) == 0
 
 
 def test_delete_basket_item_updates_stock(basket):
@@ -0,0 +1,321 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from salesman.core.utils import get_salesman_model
+
+from ..models import Product, ProductVariant, ShopSettings
+from ..stock import low_stock_variants, recount_product_stock, take_ordered_stock
+
+
+Order = get_salesman_model("Order")
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def shop_settings():
+    baker.make("shop.ShopSettings", notify_email_addresses="admin@test.com")
+
+
+@pytest.fixture
+def variant(basket):
+    # 5 in stock initially, 2 in the basket
+    yield basket.items.first().product
+
+
+def test_low_stock_flagged_when_threshold_reached(settings, basket, variant):
+    settings.LOW_STOCK_THRESHOLD = 2
+    assert variant.stock == 3
+    assert not variant.low_stock_alert_pending
+
+    basket.add(variant, quantity=1)
+    variant.refresh_from_db()
+    assert variant.stock == 2
+    assert variant.low_stock_alert_pending
+
+
+def test_low_stock_not_flagged_again_below_threshold(settings, basket, variant):
+    settings.LOW_STOCK_THRESHOLD = 3
+    # already at the threshold, so it has been reported before
+    basket.add(variant, quantity=1)
+    variant.refresh_from_db()
+    assert variant.stock == 2
+    assert not variant.low_stock_alert_pending
+
+
+def test_low_stock_flagged_when_ordered_basket_deleted(settings, basket):
+    settings.LOW_STOCK_THRESHOLD = 3
+    basket.extra = {"basket_id": basket.id}
+    basket.save()
+    Order.objects.create_from_basket(basket, request=None)
+    variant = basket.items.first().product
+    assert variant.stock == 3
+    # deleting the basket puts its items back in stock, then takes the ordered
+    # items out again
+    variant.low_stock_alert_pending = False
+    variant.save()
+    basket.delete()
+    variant.refresh_from_db()
+    assert variant.stock == 3
+    assert variant.low_stock_alert_pending
+
+
+def test_ordered_stock_taken_when_basket_deleted(
+    basket, product, django_capture_on_commit_callbacks
+):
+    small = basket.items.first().product
+    large = baker.make(ProductVariant, product=product, variant_name="L", stock=4)
+    basket.add(large, quantity=3)
+    basket.update(request=None)
+    basket.extra = {"basket_id": basket.id}
+    order = Order.objects.create_from_basket(basket, request=None)
+    assert order.basket_id == basket.id
+    # an item added to the basket after the order was created
+    basket.add(small, quantity=1)
+    assert counters(product) == (3, 2, 2)
+
+    basket.delete()
+    small.refresh_from_db()
+    large.refresh_from_db()
+    # the ordered quantities stay out of stock
+    assert (small.stock, large.stock) == (3, 1)
+    assert counters(product) == (4, 2, 2)
+
+
+def test_take_ordered_stock_queries(basket, django_assert_num_queries):
+    basket.extra = {"basket_id": basket.id}
+    Order.objects.create_from_basket(basket, request=None)
+    # the ordered variants' stock, and their products' counters
+    with django_assert_num_queries(2):
+        assert take_ordered_stock(basket.id) == 1
+    with django_assert_num_queries(1):
+        assert take_ordered_stock(0) == 0
+
+
+def test_low_stock_variants(settings, product):
+    settings.LOW_STOCK_THRESHOLD = 2
+    low = baker.make(ProductVariant, product=product, stock=1, variant_name="a")
+    lowest = baker.make(ProductVariant, product=product, stock=0, variant_name="b")
+    baker.make(ProductVariant, product=product, stock=3, variant_name="c")
+    baker.make(ProductVariant, product=product, stock=0, live=False, variant_name="d")
+    assert list(low_stock_variants()) == [lowest, low]
+
+
+def test_low_stock_report(client, admin_user, settings, product):
+    settings.LOW_STOCK_THRESHOLD = 2
+    baker.make(ProductVariant, product=product, stock=1, variant_name="Small")
+    baker.make(ProductVariant, product=product, stock=10, variant_name="Large")
+    client.force_login(admin_user)
+    resp = client.get(reverse("low_stock_report"))
+    assert resp.status_code == 200
+    content = resp.content.decode()
+    assert "Test Product - Small" in content
+    assert "Test Product - Large" not in content
+    assert "2 or fewer in stock" in content
+
+
+def test_low_stock_report_requires_permission(client, django_user_model):
+    user = baker.make(django_user_model)
+    group = baker.make(Group)
+    group.permissions.add(Permission.objects.get(codename="access_admin"))
+    user.groups.add(group)
+    client.force_login(user)
+    resp = client.get(reverse("low_stock_report"))
+    assert resp.status_code == 302
+    assert resp.url == reverse("wagtailadmin_home")
+
+    resp = client.get(reverse("wagtailadmin_home"))
+    assert reverse("low_stock_report") not in resp.content.decode()
+
+
+def test_low_stock_report_menu_item(client, admin_user):
+    client.force_login(admin_user)
+    resp = client.get(reverse("wagtailadmin_home"))
+    assert reverse("low_stock_report") in resp.content.decode()
+
+
+def test_send_low_stock_alerts(settings, shop_settings, product):
+    settings.LOW_STOCK_THRESHOLD = 2
+    low = baker.make(
+        ProductVariant,
+        product=product,
+        stock=1,
+        variant_name="Small",
+        low_stock_alert_pending=True,
+    )
+    # replenished since it was flagged
+    restocked = baker.make(
+        ProductVariant,
+        product=product,
+        stock=10,
+        variant_name="Large",
+        low_stock_alert_pending=True,
+    )
+    call_command("send_low_stock_alerts")
+
+    assert len(mail.outbox) == 1
+    email = mail.outbox[0]
+    assert email.to == ["admin@test.com"]
+    assert email.subject == "Low stock: 1 product variant"
+    assert "- Test Product - Small: 1 in stock" in email.body
+    assert "Large" not in email.body
+    assert reverse("low_stock_report") in email.body
+    assert not ProductVariant.objects.filter(
+        id__in=[low.id, restocked.id], low_stock_alert_pending=True
+    ).exists()
+
+    # already reported
+    call_command("send_low_stock_alerts")
+    assert len(mail.outbox) == 1
+
+
+def test_send_low_stock_alerts_without_notify_emails(settings, product):
+    settings.LOW_STOCK_THRESHOLD = 2
+    baker.make(ProductVariant, product=product, stock=1, low_stock_alert_pending=True)
+    call_command("send_low_stock_alerts")
+    assert len(mail.outbox) == 0
+    assert not ProductVariant.objects.filter(low_stock_alert_pending=True).exists()
+
+
+def test_low_stock_report_export(client, admin_user, product):
+    baker.make(ProductVariant, product=product, stock=0, variant_name="Small")
+    client.force_login(admin_user)
+    resp = client.get(reverse("low_stock_report"), {"export": "csv"})
+    assert resp["Content-Disposition"] == 'attachment; filename="low-stock.csv"'
+    assert b"Test Product - Small,0" in b"".join(resp.streaming_content)
+
+
+def counters(product):
+    product.refresh_from_db()
+    return (
+        product.total_stock,
+        product.live_variant_count,
+        product.in_stock_variant_count,
+    )
+
+
+def test_product_counters_follow_variant_changes(product):
+    assert counters(product) == (0, 0, 0)
+    small = baker.make(ProductVariant, product=product, stock=3, variant_name="S")
+    large = baker.make(ProductVariant, product=product, stock=0, variant_name="L")
+    assert counters(product) == (3, 2, 1)
+
+    large.stock = 4
+    large.save()
+    assert counters(product) == (7, 2, 2)
+
+    # only live variants are counted
+    small.live = False
+    small.save()
+    assert counters(product) == (4, 1, 1)
+
+    large.delete()
+    assert counters(product) == (0, 0, 0)
+
+
+def test_product_counters_follow_basket_changes(basket, product):
+    # the basket fixture's variant has 5 in stock, 2 of them in the basket
+    variant = basket.items.first().product
+    assert counters(product) == (3, 1, 1)
+    basket.add(variant, quantity=3)
+    assert counters(product) == (0, 1, 0)
+    assert product.out_of_stock()
+
+    basket.items.first().delete()
+    assert counters(product) == (5, 1, 1)
+
+
+def test_product_counters_updated_in_memory(product, django_assert_num_queries):
+    variant = baker.make(ProductVariant, product=product, stock=3)
+    # the variant's product instance is kept up to date, without reloading it
+    with django_assert_num_queries(0):
+        assert (product.total_stock, product.in_stock_variant_count) == (3, 1)
+        assert not product.out_of_stock()
+    variant.stock = 0
+    variant.save()
+    assert product.out_of_stock()
+
+
+def test_product_counters_when_two_baskets_take_the_last_one(product):
+    variant = baker.make(ProductVariant, product=product, stock=1)
+    # two requests load the variant, and each saves its stock as 0
+    loaded = [ProductVariant.objects.get(id=variant.id) for _ in range(2)]
+    for loaded_variant in loaded:
+        loaded_variant.stock = 0
+        loaded_variant.save()
+    assert counters(product) == (0, 1, 0)
+
+    variant.refresh_from_db()
+    variant.stock = 5
+    variant.save()
+    assert counters(product) == (5, 1, 1)
+    assert not Product.objects.get(id=product.id).out_of_stock()
+
+
+def test_product_counters_when_variant_moves_product(product):
+    other_product = baker.make(
+        "shop.Product", category_page=product.category_page, name="Other"
+    )
+    variant = baker.make(ProductVariant, product=product, stock=3)
+    variant.product = other_product
+    variant.save()
+    assert counters(product) == (0, 0, 0)
+    assert counters(other_product) == (3, 1, 1)
+
+
+def test_product_counters_for_variant_loaded_without_stock(product):
+    variant = baker.make(ProductVariant, product=product, stock=3)
+    variant = ProductVariant.objects.only("id", "product_id").get(id=variant.id)
+    variant.stock = 5
+    variant.save()
+    assert counters(product) == (5, 1, 1)
+    variant = ProductVariant.objects.only("id", "product_id").get(id=variant.id)
+    variant.delete()
+    assert counters(product) == (0, 0, 0)
+
+
+def test_product_save_keeps_counters(product):
+    # product instance loaded before its variant was added
+    stale_product = Product.objects.get(id=product.id)
+    baker.make(ProductVariant, product=product, stock=3)
+    stale_product.name = "Renamed"
+    stale_product.save()
+    assert counters(product) == (3, 1, 1)
+    assert product.name == "Renamed"
+
+
+def test_recount_product_stock(product):
+    baker.make(ProductVariant, product=product, stock=3, variant_name="S")
+    baker.make(ProductVariant, product=product, stock=0, variant_name="M")
+    baker.make(ProductVariant, product=product, stock=3, variant_name="L", live=False)
+    empty_product = baker.make(
+        "shop.Product", category_page=product.category_page, name="Empty"
+    )
+    Product.objects.update(
+        total_stock=10, live_variant_count=10, in_stock_variant_count=10
+    )
+    assert recount_product_stock(Product.objects.all()) == 2
+    assert counters(product) == (3, 2, 1)
+    assert counters(empty_product) == (0, 0, 0)
+
+
+def test_category_page_hide_out_of_stock(category_page, product):
+    baker.make(ProductVariant, product=product, stock=0)
+    in_stock = baker.make(
+        "shop.Product", category_page=category_page, name="In stock", index=200
+    )
+    baker.make(ProductVariant, product=in_stock, stock=1)
+    assert list(category_page.listed_products) == [product, in_stock]
+
+    shop_settings = ShopSettings.load()
+    shop_settings.hide_out_of_stock = True
+    shop_settings.save()
+    del category_page.listed_products
+    assert list(category_page.listed_products) == [in_stock]
+
+
+def test_live_products_query_does_not_join_variants(category_page):
+    assert "shop_productvariant" not in str(category_page.live_products.query)
@@ -0,0 +1,89 @@
+import pytest
+from django.core.cache import cache
+from django.template import Context, RequestContext, Template
+from django.urls import reverse
+from wagtail_factories import ImageFactory
+
+from ..breadcrumbs import (
+    CATEGORY_BREADCRUMBS_CACHE_KEY,
+    SHOP_BREADCRUMBS_CACHE_KEY,
+    get_category_breadcrumbs,
+    get_shop_breadcrumbs,
+)
+
+
+pytestmark = pytest.mark.django_db
+
+
+def render_shop_breadcrumbs(rf, path, **context):
+    template = Template("{% load shoptags %}{% shop_breadcrumbs %}")
+    return template.render(RequestContext(rf.get(path), context))
+
+
+def test_product_breadcrumbs(rf, product, django_assert_num_queries):
+    url = reverse("shop:product_detail", args=(product.id,))
+    render_shop_breadcrumbs(rf, url, product=product)
+    with django_assert_num_queries(0):
+        content = render_shop_breadcrumbs(rf, url, product=product)
+    assert f'<a href="{product.category_page.get_url()}">Test Category</a>' in content
+    assert '<li aria-current="page">Test Product</li>' in content
+
+
+def test_shop_breadcrumbs(rf, shop_page, category_page):
+    content = render_shop_breadcrumbs(rf, reverse("shop:basket"), self=category_page)
+    assert f'<a href="{shop_page.get_url()}">{shop_page.title}</a>' in content
+    assert '<li aria-current="page">Basket</li>' in content
+
+
+def test_category_page_breadcrumbs(rf, category_page):
+    content = render_shop_breadcrumbs(rf, category_page.url, self=category_page)
+    assert '<li aria-current="page">Test Category</li>' in content
+
+
+def test_shop_breadcrumbs_no_shop_page(home_page):
+    assert get_shop_breadcrumbs() == []
+    assert get_category_breadcrumbs(1) == []
+
+
+def test_shop_breadcrumbs_updated_on_publish(admin_user, shop_page, category_page):
+    assert get_category_breadcrumbs(category_page.id)[-1]["title"] == "Test Category"
+
+    category_page.title = "Renamed Category"
+    category_page.save_revision(user=admin_user).publish()
+    assert (
+        cache.get(CATEGORY_BREADCRUMBS_CACHE_KEY)[category_page.id][-1]["title"]
+        == "Renamed Category"
+    )
+    assert cache.get(SHOP_BREADCRUMBS_CACHE_KEY)[-1]["title"] == shop_page.title
+
+    category_page.unpublish()
+    assert cache.get(CATEGORY_BREADCRUMBS_CACHE_KEY) is None
+    assert cache.get(SHOP_BREADCRUMBS_CACHE_KEY) is None
+
+
+def test_product_picture(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    image = ImageFactory(file__width=800, file__height=600)
+    template = Template(
+        "{% load shoptags %}{% product_picture image 'card' loading='lazy' %}"
+    )
+    content = template.render(Context({"image": image}))
+    assert content.startswith("<picture>")
+    assert content.count("<source") == 2
+    assert 'type="image/avif"' in content
+    assert 'type="image/webp"' in content
+    assert 'sizes="180px"' in content
+    assert 'loading="lazy"' in content
+    # jpeg fallback, with a srcset across widths
+    assert ".fill-180x180-c100.format-jpeg" in content
+    assert "360w" in content
+
+
+def test_product_image_url(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    image = ImageFactory(file__width=2400, file__height=1200)
+    template = Template("{% load shoptags %}{% product_image_url image 'zoom' %}")
+    url = template.render(Context({"image": image}))
+    # a bounded rendition, not the original file
+    assert url == image.get_rendition("max-1200x1200").url
+    assert image.get_rendition("max-1200x1200").width == 1200
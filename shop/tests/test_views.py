@@ -1,14 +1,22 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+import json
 from unittest import mock
 
 import pytest
 
 from model_bakery import baker
 
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
+from salesman.checkout.payment import PaymentError
 from salesman.core.utils import get_salesman_model
 
+from home.page_cache import clear_page_cache
+
 from ..views import (
     add_to_basket,
     basket_view,
@@ -19,6 +27,7 @@ from ..views import (
     get_basket_quantity_and_total,
     _can_increase_quantity,
     increase_quantity,
+    update_basket,
     update_quantity,
     delete_basket_item,
     checkout_view,
@@ -130,6 +139,119 @@ def test_get_product_detail_view(client, product):
     assert resp.status_code == 200
 
 
+def test_product_detail_view_etag(
+    client, admin_user, product, django_assert_num_queries
+):
+    variant = baker.make("shop.ProductVariant", product=product, stock=3)
+    url = reverse("shop:product_detail", args=(product.id,))
+    # the first page rendered creates the site settings, clearing the page cache
+    client.get(url)
+    resp = client.get(url)
+    etag = resp["ETag"]
+    # the basket is loaded separately, so the page is the same for everyone
+    assert reverse("shop:basket_icon") in resp.content.decode()
+
+    # the expired basket check, the product and its variants, and the live sales
+    with django_assert_num_queries(3):
+        resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+
+    # the page also shows what the page cache version follows
+    clear_page_cache()
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    etag = resp["ETag"]
+
+    # stock changes change the ETag
+    variant.stock = 2
+    variant.save()
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp["ETag"] != etag
+
+    # as do price changes
+    etag = resp["ETag"]
+    product.price = 15
+    product.save()
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+
+    # and a sale starting
+    etag = resp["ETag"]
+    sale = baker.make(
+        "shop.Sale",
+        start_date=datetime.now(timezone.utc) - timedelta(days=1),
+        end_date=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    sale_product = baker.make(
+        "shop.SaleProduct", sale=sale, product=product, discount=10
+    )
+    etag = client.get(url, HTTP_IF_NONE_MATCH=etag)["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # or its discount changing
+    sale_product.discount = 50
+    sale_product.save()
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp["ETag"] != etag
+
+    client.force_login(admin_user)
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert not resp.has_header("ETag")
+
+
+def test_product_detail_view_not_found(client):
+    resp = client.get(reverse("shop:product_detail", args=(0,)))
+    assert resp.status_code == 404
+    assert not resp.has_header("ETag")
+
+
+def test_product_card_loads_stock(client, product):
+    variant = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Small", stock=3
+    )
+    baker.make("shop.ProductVariant", product=product, variant_name="Large", stock=0)
+    resp = client.get(reverse("shop:product_detail", args=(product.id,)))
+    content = resp.content.decode()
+    # the page is the same for every visitor; their stock is loaded separately
+    assert f'<option value="{variant.id}">' in content
+    assert "data-stock=" not in content
+    assert f'name="stock_product" value="{product.id}"' in content
+    assert reverse("shop:variant_stock") in content
+    # the +/- steppers are bounded in the browser, without requests to
+    # increase_quantity/decrease_quantity
+    assert 'data-quantity-step="1"' in content
+    assert reverse("shop:increase_quantity", args=(product.id,)) not in content
+
+
+def test_variant_stock_view(client, product, django_assert_num_queries):
+    variant = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Small", stock=3
+    )
+    baker.make("shop.ProductVariant", product=product, variant_name="Large", stock=0)
+    baker.make(
+        "shop.ProductVariant", product=product, variant_name="Old", live=False, stock=5
+    )
+    other_product = baker.make("shop.Product", category_page=product.category_page)
+
+    # the expired basket check, the products and their variants, and the sale
+    # check of each in stock variant's price
+    with django_assert_num_queries(5):
+        resp = client.get(
+            reverse("shop:variant_stock"), {"stock_product": [product.id, "x"]}
+        )
+    content = resp.content.decode()
+    # the selects of the requested products, with the bounds for the +/- steppers
+    wrapper = f'<div id="id_select_variant_wrapper_{product.id}" hx-swap-oob="true">'
+    assert wrapper in content
+    assert f'<option value="{variant.id}" data-stock="3">' in content
+    assert "(3 in stock)" in content
+    assert content.count("data-stock=") == 1
+    assert f"id_select_variant_wrapper_{other_product.id}" not in content
+
+
 @pytest.mark.parametrize(
     "current_stock,increase_to,in_basket,expected",
     [
@@ -257,6 +379,13 @@ def test_basket_view(rf, basket, product):
     item = resp.context_data["basket"]["items"][product.identifier][0]
     assert item["product_type"] == product.name
     assert item["category"] == product.category_page.title
+    # 3 in stock, plus the 2 already in the basket
+    assert item["available"] == 5
+    resp.render()
+    assert (
+        f'id="id_quantity_{item["product_id"]}" name="quantity" type="number" '
+        'value=2 min="1" max="5"'
+    ) in resp.content.decode()
 
 
 def test_add_to_basket(rf, product):
@@ -462,6 +591,133 @@ def test_update_quantity_with_error(rf, basket):
     assert "Error" in resp.content.decode()
 
 
+### Batched basket updates
+
+
+@pytest.fixture
+def large_item(basket, product):
+    # a second item, quantity 1, 3 more in stock
+    variant = baker.make(
+        "shop.ProductVariant", product=product, variant_name="Large", price=15, stock=4
+    )
+    basket.add(variant, quantity=1)
+    yield basket.items.get(product_id=variant.id)
+
+
+def post_basket_update(rf, basket, data, **kwargs):
+    request = rf.post(reverse("shop:update_basket"), data=data, **kwargs)
+    request.session = {"BASKET_ID": basket.id}
+    return update_basket(request)
+
+
+def test_update_basket(rf, basket, large_item):
+    small_item = basket.items.exclude(id=large_item.id).get()
+    resp = post_basket_update(
+        rf,
+        basket,
+        {"ref": [small_item.ref, large_item.ref], "quantity": [1, 3]},
+    )
+    assert resp.status_code == 200
+    content = resp.content.decode()
+
+    small_item.refresh_from_db()
+    large_item.refresh_from_db()
+    assert (small_item.quantity, large_item.quantity) == (1, 3)
+    small_item.product.refresh_from_db()
+    large_item.product.refresh_from_db()
+    assert (small_item.product.stock, large_item.product.stock) == (4, 1)
+
+    assert (
+        f'<span id="total_{small_item.product_id}" hx-swap-oob="true">10.00</span>'
+        in content
+    )
+    assert (
+        f'<span id="total_{large_item.product_id}" hx-swap-oob="true">45.00</span>'
+        in content
+    )
+    assert '<span id="total" hx-swap-oob="true">55.00</span>' in content
+    assert content.count("Basket updated") == 2
+
+
+def test_update_basket_json(rf, basket, large_item):
+    basket.shipping_method = "deliver"
+    basket.save()
+    resp = post_basket_update(
+        rf,
+        basket,
+        json.dumps({large_item.ref: 2}),
+        content_type="application/json",
+    )
+    large_item.refresh_from_db()
+    assert large_item.quantity == 2
+    content = resp.content.decode()
+    assert content.count("Basket updated") == 1
+    assert '<span id="total" hx-swap-oob="true">53.99</span>' in content
+    assert "£3.99" in content
+
+
+def test_update_basket_quantity_not_available(rf, basket, large_item):
+    small_item = basket.items.exclude(id=large_item.id).get()
+    resp = post_basket_update(
+        rf,
+        basket,
+        # only 4 Large available; unknown refs are ignored
+        {"ref": [small_item.ref, large_item.ref, "unknown"], "quantity": [3, 5, 1]},
+    )
+    content = resp.content.decode()
+    small_item.refresh_from_db()
+    large_item.refresh_from_db()
+    assert (small_item.quantity, large_item.quantity) == (3, 1)
+    large_item.product.refresh_from_db()
+    assert large_item.product.stock == 3
+    # the quantity field is reset to the basket quantity
+    assert (
+        f'<div id="updated_{large_item.product_id}" class="alert-danger" '
+        'hx-swap-oob="true">Quantity requested is not available</div>'
+    ) in content
+    assert (
+        f'id="id_quantity_{large_item.product_id}" name="quantity" type="number" '
+        'value=1 min="1" max="4"'
+    ) in content
+    assert '<span id="total" hx-swap-oob="true">45.00</span>' in content
+
+
+def test_update_basket_quantity_must_be_positive(rf, basket):
+    item = basket.items.get()
+    resp = post_basket_update(rf, basket, {"ref": [item.ref], "quantity": [0]})
+    item.refresh_from_db()
+    assert item.quantity == 2
+    assert "Quantity requested is not available" in resp.content.decode()
+
+
+def test_update_basket_invalid(rf, basket):
+    item = basket.items.get()
+    resp = post_basket_update(rf, basket, {"ref": [item.ref], "quantity": ["x"]})
+    assert resp.status_code == 400
+
+
+def test_update_basket_requires_post(client):
+    assert client.get(reverse("shop:update_basket")).status_code == 405
+
+
+def test_update_basket_checks_stock_in_one_query(rf, basket, large_item):
+    small_item = basket.items.exclude(id=large_item.id).get()
+    with CaptureQueriesContext(connection) as queries:
+        post_basket_update(
+            rf,
+            basket,
+            {"ref": [small_item.ref, large_item.ref], "quantity": [3, 2]},
+        )
+    variant_selects = [
+        query["sql"]
+        for query in queries
+        if query["sql"].startswith("SELECT")
+        and 'FROM "shop_productvariant"' in query["sql"]
+        and "FOR UPDATE" in query["sql"]
+    ]
+    assert len(variant_selects) == 1
+
+
 ### Delete items from basket
 
 
@@ -596,13 +852,18 @@ def test_get_checkout_view(rf, basket):
     assert resp.status_code == 200
     basket = Basket.objects.get(id=basket.id)
     assert basket.shipping_method == "deliver"
+    content = resp.render().content.decode()
+    assert "Test Product (Test Category)" in content
+    assert "Test Product - Small" in content
+    assert "£3.99" in content
+    assert '£<span id="total">23.99</span>' in content
+    # the page has the visitor's basket and checkout form
+    assert "no-store" in resp["Cache-Control"]
 
 
-@mock.patch("shop.views.CheckoutViewSet.as_view")
-def test_post_checkout_view(mock_checkout, rf, basket):
-    mock_checkout.return_value = mock_as_view_resp(
-        status_code=201, data={"url": "https://test-checkout"}
-    )
+@mock.patch("shop.payment.PayByStripe.basket_payment")
+def test_post_checkout_view(mock_payment, rf, basket):
+    mock_payment.return_value = "https://test-checkout"
 
     form_data = {
         "email": "test@test.com",
@@ -623,6 +884,87 @@ def test_post_checkout_view(mock_checkout, rf, basket):
     # redirects to the stripe payment method from the mock checkout call
     assert resp.status_code == 302
     assert resp.url == "https://test-checkout"
+    # the checkout is given the basket updated by the view
+    checkout_basket = mock_payment.call_args.args[0]
+    assert checkout_basket.total == 20
+    assert checkout_basket.extra["email"] == "test@test.com"
+
+
+@mock.patch("shop.payment.PayByStripe.basket_payment")
+def test_post_checkout_view_anonymous_checkout_not_allowed(
+    mock_payment, rf, basket, settings
+):
+    settings.SALESMAN_ALLOW_ANONYMOUS_USER_CHECKOUT = False
+    request = rf.post(
+        reverse("shop:checkout") + "?payment-method=stripe&shipping-method=collect",
+        data={
+            "email": "test@test.com",
+            "email1": "test@test.com",
+            "name": "Test",
+            "payment_method": "stripe",
+            "shipping_method": "collect",
+            "billing_address": "-",
+            "shipping_address": "-",
+        },
+    )
+    request.session = {"BASKET_ID": basket.id}
+    request.user = AnonymousUser()
+    resp = checkout_view(request)
+
+    assert resp.status_code == 200
+    assert resp.context_data["checkout_error"]
+    assert not mock_payment.called
+    assert "no-store" in resp["Cache-Control"]
+
+
+def test_get_checkout_view_queries(rf, basket, django_assert_num_queries):
+    request = rf.get(
+        reverse("shop:checkout") + "?payment-method=stripe&shipping-method=deliver"
+    )
+    request.session = {"BASKET_ID": basket.id}
+    # basket, shipping method update, items, variants, sales, timeout update,
+    # products and categories
+    with django_assert_num_queries(8):
+        resp = checkout_view(request)
+    assert resp.context_data["basket"]["total"] == "23.99"
+    assert resp.context_data["basket_quantity"] == 2
+    [item] = resp.context_data["basket"]["items"]["test-category-test-product"]
+    assert item["product_type"] == "Test Product"
+    assert item["total"] == "20.00"
+
+    # the shipping method is only written when it changes
+    with CaptureQueriesContext(connection) as queries:
+        checkout_view(request)
+    assert len(queries) == 7
+    assert not any(
+        query["sql"].startswith('UPDATE "shop_basket" SET "shipping_method"')
+        for query in queries.captured_queries
+    )
+
+
+@mock.patch("shop.payment.PayByStripe.basket_payment")
+def test_post_checkout_view_queries(
+    mock_payment, rf, basket, django_assert_num_queries
+):
+    mock_payment.return_value = "https://test-checkout"
+    request = rf.post(
+        reverse("shop:checkout") + "?payment-method=stripe&shipping-method=collect",
+        data={
+            "email": "test@test.com",
+            "email1": "test@test.com",
+            "name": "Test",
+            "payment_method": "stripe",
+            "shipping_method": "collect",
+            "billing_address": "-",
+            "shipping_address": "-",
+        },
+    )
+    request.session = {"BASKET_ID": basket.id}
+    # basket, items, variants, sales, timeout update and extra update; the
+    # checkout is validated with the totals from the same basket update
+    with django_assert_num_queries(6):
+        resp = checkout_view(request)
+    assert resp.status_code == 302
 
 
 def test_post_checkout_view_invalid_form(rf, basket):
@@ -647,11 +989,9 @@ def test_post_checkout_view_invalid_form(rf, basket):
     assert resp.context_data["form"].errors == {"email1": ["Email fields do not match"]}
 
 
-@mock.patch("shop.views.CheckoutViewSet.as_view")
-def test_post_checkout_view_non_stripe_payment_method(mock_checkout, rf, basket):
-    mock_checkout.return_value = mock_as_view_resp(
-        status_code=201, data={"url": "https://test-checkout?token=foo"}
-    )
+@mock.patch("shop.payment.PayByStripe.basket_payment")
+def test_post_checkout_view_non_stripe_payment_method(mock_payment, rf, basket):
+    mock_payment.return_value = "https://test-checkout?token=foo"
 
     form_data = {
         "email": "test@test.com",
@@ -675,11 +1015,9 @@ def test_post_checkout_view_non_stripe_payment_method(mock_checkout, rf, basket)
     assert resp.url == reverse("shop:new_order_status", args=("foo",))
 
 
-@mock.patch("shop.views.CheckoutViewSet.as_view")
-def test_post_checkout_view_error(mock_checkout, rf, basket):
-    mock_checkout.return_value = mock_as_view_resp(
-        status_code=400, data={"url": "https://test-checkout?token=foo"}
-    )
+@mock.patch("shop.payment.PayByStripe.basket_payment")
+def test_post_checkout_view_error(mock_payment, rf, basket):
+    mock_payment.side_effect = PaymentError("Payment declined")
 
     form_data = {
         "email": "test@test.com",
@@ -697,7 +1035,27 @@ def test_post_checkout_view_error(mock_checkout, rf, basket):
     request.session = {"BASKET_ID": basket.id}
     resp = checkout_view(request)
 
-    # redirects to the new order status using the token from the mock checkout call
+    assert resp.status_code == 200
+    assert "checkout_error" in resp.context_data
+
+
+def test_post_checkout_view_empty_basket(rf):
+    form_data = {
+        "email": "test@test.com",
+        "email1": "test@test.com",
+        "name": "Test",
+        "payment_method": "stripe",
+        "shipping_method": "collect",
+        "billing_address": "-",
+        "shipping_address": "-",
+    }
+    request = rf.post(
+        reverse("shop:checkout") + "?payment-method=stripe&shipping-method=collect",
+        data=form_data,
+    )
+    request.session = {}
+    resp = checkout_view(request)
+    # the checkout serializer doesn't allow payment for an empty basket
     assert resp.status_code == 200
     assert "checkout_error" in resp.context_data
 
@@ -726,6 +1084,73 @@ def test_order_status_view(rf, order):
     assert "Thank you for your order!" not in resp.rendered_content
 
 
+def test_order_status_view_renders_items_as_ordered(
+    rf, order, product, django_assert_num_queries
+):
+    item = order.items.get()
+    assert item.product_data == {
+        "name": "Test Product - Small",
+        "code": str(item.product_id),
+        "identifier": "test-category-test-product",
+        "product_type": "Test Product",
+        "category": "Test Category",
+        "variant_name": "Small",
+    }
+    # later changes to the products don't change the orders
+    product.name = "Renamed"
+    product.save()
+    variant = item.product
+    variant.variant_name = "Renamed"
+    variant.save()
+
+    request = rf.get("/")
+    # order, items and payments
+    with django_assert_num_queries(3):
+        resp = order_status_view(request, order.token)
+    [ordered] = resp.context_data["order"]["items"]["test-category-test-product"]
+    assert ordered["product_type"] == "Test Product"
+    assert ordered["total"] == 20
+    assert "Test Product - Small (Test Category) - 2 - £20.00" in resp.rendered_content
+
+
+def test_order_status_view_etag(client, order, django_assert_num_queries):
+    url = reverse("shop:order_status", args=(order.token,))
+    resp = client.get(url)
+    etag = resp["ETag"]
+    assert resp["Last-Modified"] == http_date(order.date_updated.timestamp())
+
+    # the expired basket check, and the order's status and last change
+    with django_assert_num_queries(2):
+        resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+    resp = client.get(url, HTTP_IF_MODIFIED_SINCE=resp["Last-Modified"])
+    assert resp.status_code == 304
+    # the ETag comes from the order's own state, not the page cache's
+    clear_page_cache()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    payment = baker.make("shop.OrderPayment", order=order, amount=5)
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert "Amount paid: £5" in resp.content.decode()
+    assert resp["Last-Modified"] == http_date(payment.date_created.timestamp())
+
+    etag = resp["ETag"]
+    order.status = "PROCESSING"
+    order.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    # the new order page has its own ETag
+    resp = client.get(reverse("shop:new_order_status", args=(order.token,)))
+    assert resp["ETag"] != etag
+
+
+def test_order_status_view_not_found(client):
+    resp = client.get(reverse("shop:order_status", args=("unknown",)))
+    assert resp.status_code == 404
+    assert not resp.has_header("ETag")
+
+
 def test_new_order_status_view(rf, order):
     request = rf.get("/")
     resp = new_order_view(request, order.token)
@@ -769,3 +1194,24 @@ def test_basket_timeout_view(client, basket, freezer):
         resp.content.decode()
         == "<div></div><div id='basket-countdown-container' hx-swap-oob='true'></div>"
     )
+
+    basket.delete()
+    assert client.get(url, headers=headers).status_code == 404
+
+
+def test_basket_timeout_view_under_asgi(asgi_get, basket, freezer):
+    freezer.move_to(datetime(2023, 10, 1, 12, 0, tzinfo=timezone.utc))
+    basket.timeout = datetime(2023, 10, 1, 12, 10, tzinfo=timezone.utc)
+    basket.save()
+    url = reverse("shop:basket_timeout", args=(basket.id,))
+    assert asgi_get(url).content.decode() == "10m 0s"
+
+
+def test_basket_icon_view(client, basket):
+    session = client.session
+    session["BASKET_ID"] = basket.id
+    session.save()
+    resp = client.get(reverse("shop:basket_icon"))
+    assert '<i class="fa-solid fa-basket-shopping"></i>  (2)' in resp.content.decode()
+    # makes sure the visitor has a csrf cookie, for use on cached pages
+    assert "csrftoken" in resp.cookies
@@ -0,0 +1,136 @@
+import csv
+from io import BytesIO
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.urls import reverse
+from model_bakery import baker
+from openpyxl import load_workbook
+from salesman.core.utils import get_salesman_model
+
+from ..exports import HEADERS, get_export_queryset, order_rows
+
+
+Order = get_salesman_model("Order")
+
+
+pytestmark = pytest.mark.django_db
+
+
+def export_url(file_format):
+    return reverse("shop_order_modeladmin_export", args=(file_format,))
+
+
+@pytest.fixture
+def paid_order(order):
+    baker.make(
+        "shop.OrderPayment",
+        order=order,
+        amount=order.total,
+        transaction_id="txn_1",
+        payment_method="stripe",
+    )
+    baker.make(
+        "shop.OrderNote", order=order, message="Left with neighbour", public=True
+    )
+    yield order
+
+
+def test_order_index_export_buttons(client, admin_user, order):
+    client.force_login(admin_user)
+    resp = client.get(reverse("shop_order_modeladmin_index"), {"status": "PROCESSING"})
+    content = resp.content.decode()
+    assert f'href="{export_url("csv")}?status=PROCESSING"' in content
+    assert f'href="{export_url("xlsx")}?status=PROCESSING"' in content
+
+
+def test_export_orders_csv(client, admin_user, paid_order):
+    client.force_login(admin_user)
+    resp = client.get(export_url("csv"))
+    assert resp.streaming
+    assert resp["Content-Type"] == "text/csv"
+    assert resp["Content-Disposition"].startswith('attachment; filename="orders-')
+
+    rows = list(csv.reader(b"".join(resp.streaming_content).decode().splitlines()))
+    assert rows[0] == HEADERS
+    records = {row[8]: dict(zip(HEADERS, row)) for row in rows[1:]}
+    assert set(records) == {"order", "item", "payment", "note"}
+    assert {row[0] for row in rows[1:]} == {paid_order.ref}
+    assert records["order"]["Name"] == "Test User"
+    assert records["order"]["Shipping method"] == "Collect in store"
+    assert records["item"]["Description"] == "Test Product - Small"
+    assert records["item"]["Quantity"] == "2"
+    assert records["item"]["Amount"] == "20.00"
+    assert records["payment"]["Reference"] == "txn_1"
+    assert records["note"]["Description"] == "Left with neighbour"
+
+
+def test_export_orders_filters(client, admin_user, order):
+    client.force_login(admin_user)
+    resp = client.get(export_url("csv"), {"status": "COMPLETED"})
+    assert len(b"".join(resp.streaming_content).decode().splitlines()) == 1
+
+    resp = client.get(export_url("csv"), {"status": order.status})
+    assert len(b"".join(resp.streaming_content).decode().splitlines()) == 3
+
+
+def test_export_orders_search(client, admin_user, order):
+    other_order = baker.make("shop.Order", email="other@example.com")
+    client.force_login(admin_user)
+    # the export has the orders the listing shows
+    resp = client.get(export_url("csv"), {"q": "other@example.com"})
+    rows = list(csv.reader(b"".join(resp.streaming_content).decode().splitlines()))
+    assert {row[0] for row in rows[1:]} == {other_order.ref}
+
+
+def test_export_orders_invalid_filters(client, admin_user, order):
+    client.force_login(admin_user)
+    resp = client.get(export_url("csv"), {"date_created__gte": "not-a-date"})
+    assert resp.status_code == 400
+
+
+def test_export_orders_escapes_formulas(client, admin_user, order):
+    order.name = '=HYPERLINK("http://example.com")'
+    order.save()
+    client.force_login(admin_user)
+    resp = client.get(export_url("csv"))
+    rows = list(csv.reader(b"".join(resp.streaming_content).decode().splitlines()))
+    assert rows[1][3] == '\'=HYPERLINK("http://example.com")'
+
+    resp = client.get(export_url("xlsx"))
+    workbook = load_workbook(BytesIO(b"".join(resp.streaming_content)))
+    rows = list(workbook["Orders"].values)
+    assert rows[1][3] == '\'=HYPERLINK("http://example.com")'
+
+
+def test_export_orders_xlsx(client, admin_user, paid_order):
+    client.force_login(admin_user)
+    resp = client.get(export_url("xlsx"))
+    assert resp["Content-Disposition"].startswith('attachment; filename="orders-')
+    workbook = load_workbook(BytesIO(b"".join(resp.streaming_content)))
+    rows = list(workbook["Orders"].values)
+    assert list(rows[0]) == HEADERS
+    assert [row[8] for row in rows[1:]] == ["order", "item", "payment", "note"]
+
+
+def test_export_orders_requires_permission(client, django_user_model):
+    user = baker.make(django_user_model)
+    group = baker.make(Group)
+    group.permissions.add(Permission.objects.get(codename="access_admin"))
+    user.groups.add(group)
+    client.force_login(user)
+    # wagtail redirects to the dashboard when permission is denied
+    resp = client.get(export_url("csv"))
+    assert resp.status_code == 302
+    assert resp.url == reverse("wagtailadmin_home")
+
+
+def test_export_queries_do_not_depend_on_number_of_orders(
+    paid_order, django_assert_num_queries
+):
+    for order in baker.make("shop.Order", _quantity=3):
+        baker.make("shop.OrderItem", order=order, _quantity=2)
+    # orders, then items, payments and notes for the chunk
+    with django_assert_num_queries(4):
+        rows = list(order_rows(get_export_queryset(Order.objects.all())))
+    assert len(rows) == 1 + 4 + 3 * 3
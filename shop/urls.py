@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     ProductDetailView,
     add_to_basket,
+    basket_icon,
     basket_view,
     basket_timeout,
     checkout_view,
@@ -11,7 +12,9 @@ from .views import (
     increase_quantity,
     new_order_view,
     order_status_view,
+    update_basket,
     update_quantity,
+    variant_stock,
 )
 
 
@@ -25,9 +28,12 @@ urlpatterns = [
     path("quantity/dec/<int:product_id>", decrease_quantity, name="decrease_quantity"),
     path("quantity/inc/<int:product_id>", increase_quantity, name="increase_quantity"),
     path("basket/add/<int:product_id>", add_to_basket, name="add_to_basket"),
+    path("basket/update/", update_basket, name="update_basket"),
     path("basket/update/<str:ref>", update_quantity, name="update_quantity"),
     path("basket/delete/<str:ref>", delete_basket_item, name="delete_basket_item"),
     path("basket/", basket_view, name="basket"),
+    path("basket-icon/", basket_icon, name="basket_icon"),
+    path("variant-stock/", variant_stock, name="variant_stock"),
     path("basket-timeout/<int:basket_id>", basket_timeout, name="basket_timeout"),
     path("checkout/", checkout_view, name="checkout"),
     path("order/<str:token>/new/", new_order_view, name="new_order_status"),
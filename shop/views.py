@@ -1,20 +1,44 @@
 from urllib.parse import parse_qsl, urlparse
+import json
 import logging
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Max, Prefetch, prefetch_related_objects
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+)
+from django.middleware.csrf import get_token
 from django.shortcuts import render, get_object_or_404
 from django.template.response import TemplateResponse
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import DetailView
 from salesman.basket.views import BasketViewSet
+from salesman.checkout.payment import PaymentError
+from salesman.checkout.serializers import CheckoutSerializer
 from salesman.checkout.views import CheckoutViewSet
+from salesman.conf import app_settings
 from salesman.core.utils import get_salesman_model
 
+from home.page_cache import is_cacheable, page_cache_version, page_etag
+
 from .forms import CheckoutForm
-from .models import ProductVariant, Product, SHIPPING_METHODS
+from .models import (
+    ProductVariant,
+    Product,
+    Sale,
+    SHIPPING_METHODS,
+    prefetch_product_images,
+)
 from .payment import PAYMENT_METHOD_DESCRIPTIONS
 
 
@@ -66,7 +90,11 @@ def get_basket_context(basket):
     basket_quantity = _get_basket_quantity(basket)
     items_by_product = {}
     for item in basket.get("items", []):
-        product_type = ProductVariant.objects.get(id=item["product_id"]).product
+        variant = ProductVariant.objects.get(id=item["product_id"])
+        product_type = variant.product
+        # the most this item's quantity can be stepped up to in the browser;
+        # stock excludes the quantity already in the basket
+        item["available"] = variant.stock + int(item["quantity"])
         item["product_type"] = product_type.name
         item["category"] = product_type.category_page.title
         items_by_product.setdefault(product_type.identifier, []).append(item)
@@ -74,6 +102,38 @@ def get_basket_context(basket):
     return {"basket": basket, "basket_quantity": basket_quantity}
 
 
+def _basket_summary(basket, request):
+    """
+    Context for the basket summary, in the form get_basket_context gives it,
+    from a basket that has already been updated by its modifiers. The items'
+    products and categories are loaded together.
+    """
+    items = basket.get_items()
+    prefetch_related_objects([item.product for item in items], "product__category_page")
+    items_by_product = {}
+    for item in items:
+        variant = item.product
+        items_by_product.setdefault(variant.product.identifier, []).append(
+            {
+                "product_id": item.product_id,
+                "product": {"name": variant.name},
+                "quantity": item.quantity,
+                "total": _format_price(item.total, request),
+                "product_type": variant.product.name,
+                "category": variant.product.category_page.title,
+            }
+        )
+    return {
+        "basket": {
+            "id": basket.id,
+            "items": items_by_product,
+            "extra_rows": [row.data for row in basket.extra_rows.values()],
+            "total": _format_price(basket.total, request),
+        },
+        "basket_quantity": sum(item.quantity for item in items),
+    }
+
+
 def _get_basket_quantity(basket):
     return sum(int(item["quantity"]) for item in basket.get("items", []))
 
@@ -103,6 +163,36 @@ def _can_increase_quantity(request, variant, value, in_basket=False):
 # VIEWS
 
 
+def _product_state(pk):
+    # The product's and its variants' stored values (their prices, stock and
+    # images among them), in one row per variant
+    fields = [field.attname for field in Product._meta.concrete_fields]
+    fields += [
+        f"variants__{field.attname}" for field in ProductVariant._meta.concrete_fields
+    ]
+    return Product.objects.filter(pk=pk).order_by("variants").values_list(*fields)
+
+
+def _product_etag(request, pk):
+    # Product pages show the product and its variants, and sale discounts,
+    # which change as sales start and end. They also show what the page cache
+    # version follows: sale discounts and banners, categories and the footer.
+    if not is_cacheable(request):
+        return None
+    product_state = list(_product_state(pk))
+    if not product_state:
+        return None
+    now = timezone.now()
+    live_sales = Sale.objects.filter(start_date__lte=now, end_date__gt=now)
+    return page_etag(
+        "product",
+        page_cache_version(),
+        *product_state,
+        *live_sales.values_list("id", flat=True),
+    )
+
+
+@method_decorator(condition(etag_func=_product_etag), name="dispatch")
 class ProductDetailView(DetailView):
     model = Product
     template_name = "shop/shop_product_page.html"
@@ -111,6 +201,10 @@ class ProductDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
         context_data["detail_page"] = True
+        # the page is the same for every visitor, so that it can be revalidated
+        # with its ETag; the basket is loaded separately
+        context_data["cached_page"] = True
+        prefetch_product_images([self.object], "detail", "zoom")
         return context_data
 
 
@@ -183,7 +277,11 @@ def add_to_basket(request, product_id):
             # update variant dropdown, including out of stock message
             variant_html = render_to_string(
                 "shop/includes/select_variant_field.html",
-                {"product": variant.product, "product_id": product_id},
+                {
+                    "product": variant.product,
+                    "product_id": product_id,
+                    "variants": variant.product.live_variants,
+                },
                 request,
             )
             resp_str += f"<div id='id_select_variant_wrapper_{ product_id }' hx-swap-oob='true'>{variant_html}</div>"
@@ -260,6 +358,87 @@ def update_quantity(request, ref):
     return HttpResponse(result_html)
 
 
+def _basket_changes(request):
+    # {ref: quantity}, from a JSON object or from the basket page's ref and
+    # quantity fields (one of each per item, in the same order)
+    if request.content_type == "application/json":
+        changes = json.loads(request.body)
+    else:
+        changes = dict(
+            zip(request.POST.getlist("ref"), request.POST.getlist("quantity"))
+        )
+    return {str(ref): int(quantity) for ref, quantity in changes.items()}
+
+
+def _format_price(value, request):
+    return app_settings.SALESMAN_PRICE_FORMATTER(value, context={"request": request})
+
+
+@require_POST
+def update_basket(request):
+    """
+    Change the quantities of any number of basket items at once. Stock for all
+    the items is checked in one query and the changes are saved in one
+    transaction; the response has out-of-band fragments for every item changed,
+    and the basket totals.
+    """
+    try:
+        changes = _basket_changes(request)
+    except (AttributeError, TypeError, ValueError):
+        return HttpResponseBadRequest("Invalid basket changes")
+
+    basket, _ = Basket.objects.get_or_create_from_request(request)
+    errors = {}
+    available = {}
+    with transaction.atomic():
+        items = {
+            item.ref: item
+            for item in basket.items.filter(ref__in=changes)
+            if item.quantity != changes[item.ref]
+        }
+        # Lock the variants, so that the stock checked is the stock updated
+        variants = ProductVariant.objects.select_for_update().in_bulk(
+            [item.product_id for item in items.values()]
+        )
+        for ref, item in items.items():
+            variant = variants.get(item.product_id)
+            quantity = changes[ref]
+            # stock excludes the quantity already in the basket
+            if variant is None or not 0 < quantity <= variant.stock + item.quantity:
+                errors[ref] = "Quantity requested is not available"
+                available[ref] = variant.stock + item.quantity if variant else 0
+                continue
+            item.product = variant
+            item.quantity = quantity
+            # the stock is updated by the post_save_item signal
+            item.save()
+        basket.update(request)
+
+    updated_items = [
+        {
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "subtotal": _format_price(item.subtotal, request),
+            "total": _format_price(item.total, request),
+            "error": errors.get(item.ref),
+            "available": available.get(item.ref),
+        }
+        for item in basket.get_items()
+        if item.ref in items
+    ]
+    return HttpResponse(
+        render_to_string(
+            "shop/includes/basket_updates.html",
+            {
+                "items": updated_items,
+                "total": _format_price(basket.total, request),
+                "extra_rows": [row.data for row in basket.extra_rows.values()],
+            },
+            request,
+        )
+    )
+
+
 def delete_basket_item(request, ref):
     # This is the product variant ID
     product_id = int(request.POST.get("product_id"))
@@ -318,6 +497,27 @@ def _basket_icon_html(request, quantity):
     )
 
 
+def basket_icon(request):
+    # The per-visitor part of cached shop pages, loaded by htmx. Cached pages also
+    # contain someone else's CSRF token, so make sure this visitor has a csrf cookie.
+    get_token(request)
+    return HttpResponse(_basket_icon_html(request, get_basket_quantity(request)))
+
+
+def variant_stock(request):
+    # Cached shop pages aren't cleared as stock changes, so they leave the stock out
+    # of their variant selects and swap these in, with the current stock
+    product_ids = [pk for pk in request.GET.getlist("stock_product") if pk.isdigit()]
+    products = Product.objects.filter(id__in=product_ids).prefetch_related(
+        Prefetch(
+            "variants",
+            queryset=ProductVariant.objects.filter(live=True),
+            to_attr="stock_variants",
+        )
+    )
+    return render(request, "shop/includes/variant_stock.html", {"products": products})
+
+
 def basket_view(request):
     basket = get_basket(request)
     basket_context = get_basket_context(basket)
@@ -338,11 +538,20 @@ def basket_view(request):
     )
 
 
+@never_cache
 def checkout_view(request):
     payment_method = request.GET["payment-method"]
     shipping_method = request.GET["shipping-method"]
     context = {"payment_method": payment_method, "shipping_method": shipping_method}
 
+    # The basket is loaded and its modifiers are run once; the same totals are
+    # used to validate the checkout and for the order summary
+    basket, _ = Basket.objects.get_or_create_from_request(request)
+    if request.method == "GET" and basket.shipping_method != shipping_method:
+        Basket.objects.filter(id=basket.id).update(shipping_method=shipping_method)
+        basket.shipping_method = shipping_method
+    basket.update(request)
+
     if request.method == "POST":
         form = CheckoutForm(
             payment_method=payment_method,
@@ -350,50 +559,117 @@ def checkout_view(request):
             data=request.POST,
         )
         if form.is_valid():
-            checkout = CheckoutViewSet.as_view({"post": "create"})(request)
-
-            if checkout.status_code == 201:
+            checkout = _checkout(request, basket)
+            if checkout is not None:
                 if payment_method == "stripe":
-                    return HttpResponseRedirect(checkout.data["url"])
+                    return HttpResponseRedirect(checkout["url"])
 
-                parsed_url = urlparse(checkout.data["url"])
+                parsed_url = urlparse(checkout["url"])
                 token = dict(parse_qsl(parsed_url.query))["token"]
                 return HttpResponseRedirect(
                     reverse("shop:new_order_status", args=(token,))
                 )
             context["checkout_error"] = True
     else:
-        # update basket with shipping method
-        basket = Basket.objects.get(id=get_basket(request)["id"])
-        basket.shipping_method = shipping_method
-        basket.save()
         form = CheckoutForm(
             payment_method=payment_method, shipping_method=shipping_method
         )
 
-    request.method = "GET"
-    basket = get_basket(request)
-    context = {**context, "form": form, **get_basket_context(basket)}
-
+    context = {**context, "form": form, **_basket_summary(basket, request)}
     return TemplateResponse(request, "shop/checkout.html", context)
 
 
+def _checkout(request, basket):
+    # As salesman's CheckoutViewSet, with the basket that has already been
+    # updated; returns the payment data (with the url to redirect to), or None
+    if (
+        not app_settings.SALESMAN_ALLOW_ANONYMOUS_USER_CHECKOUT
+        and not request.user.is_authenticated
+    ):
+        logger.error("Checkout error: anonymous checkout not allowed")
+        return None
+    serializer = CheckoutSerializer(
+        data=request.POST, context={"request": request, "basket": basket}
+    )
+    if not serializer.is_valid():
+        logger.error("Checkout error: %s", serializer.errors)
+        return None
+    try:
+        serializer.save()
+    except PaymentError as error:
+        logger.error("Checkout payment error: %s", error)
+        return None
+    return serializer.data
+
+
+def _order_version(request, token):
+    # The order's status and when it or its payments last changed; looked up
+    # once per request, for both the ETag and Last-Modified
+    if not is_cacheable(request):
+        return None
+    if not hasattr(request, "order_version"):
+        request.order_version = (
+            Order.objects.filter(token=token)
+            .annotate(last_payment=Max("payments__date_created"))
+            .values("status", "date_updated", "last_payment")
+            .first()
+        )
+    return request.order_version
+
+
+def _order_etag(request, token):
+    order_version = _order_version(request, token)
+    if order_version is None:
+        return None
+    return page_etag("order", token, *order_version.values())
+
+
+def _order_last_modified(request, token):
+    order_version = _order_version(request, token)
+    if order_version is None:
+        return None
+    return max(
+        filter(None, [order_version["date_updated"], order_version["last_payment"]])
+    )
+
+
+@condition(etag_func=_order_etag, last_modified_func=_order_last_modified)
 def new_order_view(request, token):
     return _order_status(request, token, new=True)
 
 
+@condition(etag_func=_order_etag, last_modified_func=_order_last_modified)
 def order_status_view(request, token):
     return _order_status(request, token)
 
 
 def _order_status(request, token, new=False):
-    order = get_object_or_404(Order, token=token)
-    serialized_order = order.serializable_data()
-    order_as_basket = get_basket_context(serialized_order)["basket"]
+    # Rendered from the order and its items as they were stored when the
+    # order was created, with the current status and payments
+    order = get_object_or_404(
+        Order.objects.prefetch_related("items", "payments"), token=token
+    )
+    items_by_product = {}
+    for item in order.items.all():
+        items_by_product.setdefault(item.product_data.get("identifier"), []).append(
+            {
+                "product": item.product_data,
+                "product_type": item.product_data.get("product_type"),
+                "category": item.product_data.get("category"),
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "total": item.total,
+            }
+        )
     context = {
         "order": {
-            **serialized_order,
-            **order_as_basket,
+            "ref": order.ref,
+            "status_display": order.status_display,
+            "items": items_by_product,
+            "date_created": order.date_created,
+            "shipping_method": order.shipping_method,
+            "shipping_address": order.shipping_address,
+            "total": order.total,
             "amount_outstanding": order.amount_outstanding,
             "amount_paid": order.amount_paid,
         },
@@ -403,14 +679,18 @@ def _order_status(request, token, new=False):
     return TemplateResponse(request, "shop/order_status.html", context)
 
 
-def basket_timeout(request, basket_id):
-    basket = get_object_or_404(Basket, id=basket_id)
-    if basket.items.exists():
+async def basket_timeout(request, basket_id):
+    # Polled every second while the basket page is open, so it runs without
+    # holding a worker thread under ASGI
+    basket = await Basket.objects.filter(id=basket_id).afirst()
+    if basket is None:
+        raise Http404
+    if await basket.items.aexists():
         time_left = basket.timeout - timezone.now()
         if time_left.total_seconds() >= 0:
             return HttpResponse(f"{time_left.seconds // 60}m {time_left.seconds % 60}s")
         # expired; timeout and redirect
-        Basket.clear_expired()
+        await sync_to_async(Basket.clear_expired)()
         messages.error(request, "Basket has expired")
         redirect_url = reverse("shop:basket")
         resp = HttpResponseRedirect(redirect_url)
@@ -1,12 +1,24 @@
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import BadRequest
+from django.urls import path, re_path, reverse
+
 from salesman.admin.wagtail.panels import ReadOnlyPanel
+from salesman.admin.wagtail.views import OrderIndexView as SalesmanOrderIndexView
 from salesman.admin.wagtail_hooks import OrderAdmin as SalesmanOrderAdmin
 from salesman.core.utils import get_salesman_model
-from wagtail.admin.ui.tables import BooleanColumn
+from wagtail import hooks
+from wagtail.admin.menu import MenuItem
+from wagtail.admin.ui.tables import BooleanColumn, Column, TitleColumn
+from wagtail.admin.views.reports import ReportView
+from wagtail.permission_policies import ModelPermissionPolicy
 from wagtail_modeladmin.options import modeladmin_register
 from wagtail.snippets.models import register_snippet
 from wagtail.snippets.views.snippets import SnippetViewSet, SnippetViewSetGroup
 
+from .exports import EXPORTERS
 from .models import Product, ProductVariant, Sale, SaleCategory, SaleProduct
+from .stock import low_stock_variants
 
 
 Order = get_salesman_model("Order")
@@ -53,6 +65,30 @@ class ProductGroup(SnippetViewSetGroup):
     menu_order = 200
 
 
+class OrderIndexView(SalesmanOrderIndexView):
+    def get_queryset(self, request=None):
+        try:
+            return super().get_queryset(request)
+        except IncorrectLookupParameters as e:
+            # e.g. a malformed date in the filters
+            raise BadRequest("Invalid order filters") from e
+
+    def as_spreadsheet(self, queryset, spreadsheet_format):
+        # Export the listing's filtered and searched orders with their items,
+        # payments and notes
+        return EXPORTERS[spreadsheet_format](queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["export_urls"] = {
+            file_format: reverse(
+                self.url_helper.get_action_url_name("export"), args=(file_format,)
+            )
+            for file_format in EXPORTERS
+        }
+        return context
+
+
 class OrderAdmin(SalesmanOrderAdmin):
     SalesmanOrderAdmin.list_display.insert(2, "name")
     SalesmanOrderAdmin.list_display.insert(4, "shipping_method")
@@ -62,6 +98,88 @@ class OrderAdmin(SalesmanOrderAdmin):
         3, ReadOnlyPanel("shipping_method")
     )
     menu_order = 250
+    index_view_class = OrderIndexView
+    index_template_name = "shop/admin/order_index.html"
+
+    def get_admin_urls_for_registration(self):
+        urls = super().get_admin_urls_for_registration()
+        urls += (
+            re_path(
+                rf"^{self.url_helper.base_url_path}/export/"
+                rf"(?P<file_format>{'|'.join(EXPORTERS)})/$",
+                self.export_view,
+                name=self.url_helper.get_action_url_name("export"),
+            ),
+        )
+        return urls
+
+    def export_view(self, request, file_format):
+        # Exported by the listing's view (see OrderIndexView.as_spreadsheet), so
+        # that the export has the orders the listing shows, with its filters,
+        # search and permission check
+        request.GET = request.GET.copy()
+        request.GET[OrderIndexView.EXPORT_VAR] = file_format
+        return self.index_view(request)
+
+
+class LowStockReportView(ReportView):
+    page_title = "Low stock"
+    header_icon = "warning"
+    index_url_name = "low_stock_report"
+    index_results_url_name = "low_stock_report_results"
+    permission_policy = ModelPermissionPolicy(ProductVariant)
+    permission_required = "change"
+    columns = [
+        TitleColumn(
+            "name",
+            label="Product variant",
+            get_url=lambda variant: reverse(
+                "wagtailsnippets_shop_productvariant:edit", args=(variant.pk,)
+            ),
+        ),
+        Column("stock"),
+        Column("price"),
+    ]
+    list_export = ["name", "stock", "price"]
+
+    def get_page_subtitle(self):
+        return f"Live product variants with {settings.LOW_STOCK_THRESHOLD} or fewer in stock"
+
+    def get_filename(self):
+        return "low-stock"
+
+    def get_queryset(self):
+        return low_stock_variants()
+
+
+@hooks.register("register_admin_urls")
+def register_low_stock_report_urls():
+    return [
+        path(
+            "reports/low-stock/", LowStockReportView.as_view(), name="low_stock_report"
+        ),
+        path(
+            "reports/low-stock/results/",
+            LowStockReportView.as_view(results_only=True),
+            name="low_stock_report_results",
+        ),
+    ]
+
+
+class LowStockMenuItem(MenuItem):
+    def is_shown(self, request):
+        return request.user.has_perm("shop.change_productvariant")
+
+
+@hooks.register("register_reports_menu_item")
+def register_low_stock_report_menu_item():
+    return LowStockMenuItem(
+        "Low stock",
+        reverse("low_stock_report"),
+        name="low-stock",
+        icon_name="warning",
+        order=100,
+    )
 
 
 register_snippet(ProductGroup)